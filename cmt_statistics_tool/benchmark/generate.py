@@ -0,0 +1,399 @@
+"""
+Generate synthetic CMT exports for tests and benchmarks.
+
+The generated files have the layout and the columns the insert modules expect:
+papers, reviews and metareviews with original and revision sheets, the people file,
+and the submission revision mapping. All content is random, but consistent between
+the files, e.g. every review is written by a reviewer listed for its paper.
+
+Usage: python -m cmt_statistics_tool.benchmark.generate DIRECTORY PAPERS
+"""
+from argparse import ArgumentParser
+from pathlib import Path
+from random import Random
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Sequence, Tuple
+
+from openpyxl import Workbook
+from pandas import DataFrame
+
+from cmt_statistics_tool.insert import metareviews, papers, reviews
+from cmt_statistics_tool.tables import Submission
+from cmt_statistics_tool.tables.paper import RevisionStatus, SubmissionStatus
+
+# Excel's row limit minus the title, skipped and header rows
+MAX_SHEET_ROWS = 1048576 - 3
+
+FIRST_NAMES = (
+    "Anna Ben Chen Daniela Elif Felix Grace Hiroshi Ines Jonas Kavya Lars Maria "
+    "Nikolai Olga Pedro Qing Rosa Samir Tanja Uwe Vera Wei Xenia Yusuf Zoe"
+).split()
+LAST_NAMES = (
+    "Abadi Berg Costa Dubois Eriksen Fischer Garcia Huang Ivanova Jensen Kim Lopez "
+    "Müller Nakamura Olsen Patel Quinn Rossi Schmidt Tanaka Ueda Varga Wang Yilmaz"
+).split()
+ORGANIZATIONS = (
+    ("Hasso Plattner Institute", "Germany"),
+    ("University of Washington", "United States"),
+    ("Tsinghua University", "China"),
+    ("ETH Zurich", "Switzerland"),
+    ("University of Tokyo", "Japan"),
+    ("CWI Amsterdam", "Netherlands"),
+    ("IIT Delhi", "India"),
+    ("Universidade de São Paulo", "Brazil"),
+)
+WORDS = (
+    "data query index transaction storage stream graph learned optimizer join "
+    "distributed cloud benchmark scalable efficient novel robust adaptive approximate "
+    "workload cardinality estimation compression partitioning replication consistency "
+    "evaluation experiments results approach system model performance analysis"
+).split()
+SUBJECT_AREAS = (
+    "Database Engines",
+    "Data Mining and Analytics",
+    "Data Management for ML",
+    "Distributed Systems",
+    "Graphs and Networks",
+    "Information Integration",
+)
+RATINGS = ("Accept", "Weak Accept", "Weak Reject", "Reject")
+EXPERTISE = (
+    "Expert in this problem",
+    "Knowledgeable in this sub-area ",
+    "Generally aware of the area",
+    "Had to use common sense and general knowledge",
+)
+CATEGORIES = ("Regular Research Paper", "Experiments and Analysis", "Vision")
+EMBARGO = next(
+    k
+    for k, v in papers.paper_mappings[Submission].columns.items()
+    if v == "embargo_agreement"
+)
+
+
+def header(first: List[str], columns: Iterable[str]) -> List[str]:
+    """The first columns, then all others except the ids assigned on insert"""
+    return first + [c for c in columns if c not in first and not c.endswith(" ID")]
+
+
+PAPER_HEADER = header(
+    [
+        "Paper ID",
+        "Paper Title",
+        "Abstract",
+        "Primary Contact Author Name",
+        "Primary Contact Author Email",
+        "Authors",
+        "Author Emails",
+        "Reviewers",
+        "Reviewer Emails",
+        "MetaReviewers",
+        "MetaReviewer Emails",
+        "SeniorMetaReviewers",
+        "SeniorMetaReviewerEmails",
+    ],
+    papers.paper_mappings[Submission].columns,
+)
+
+
+class Person(NamedTuple):
+    first_name: str
+    middle_initial: str
+    last_name: str
+    email: str
+    organization: str
+    country: str
+
+    @property
+    def name(self) -> str:
+        """The name as constructed by the people insert module"""
+        middle = f" {self.middle_initial}" if self.middle_initial else ""
+        return f"{self.first_name}{middle} {self.last_name}"
+
+
+class Paper(NamedTuple):
+    id: int
+    title: str
+    revision: bool
+    status: str
+    authors: List[Person]
+    reviewers: List[Person]
+    metareviewer: Person
+    seniormetareviewer: Person
+
+
+def generate_people(rng: Random, count: int) -> List[Person]:
+    people = []
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        organization, country = rng.choice(ORGANIZATIONS)
+        people.append(
+            Person(
+                first,
+                rng.choice("ABCDEFGHJKLMNPRSTW") + "." if rng.random() < 0.2 else "",
+                last,
+                f"{first}.{last}.{i}@example.org".lower(),
+                organization,
+                country,
+            )
+        )
+    return people
+
+
+def generate_papers(
+    rng: Random, count: int, people: Sequence[Person], revision_share: float
+) -> Tuple[List[Paper], List[Paper]]:
+    """Generate original submissions and the revisions of some of them"""
+    reviewers = people[: max(10, len(people) // 4)]
+    metareviewers = people[: max(3, len(people) // 20)]
+    submissions = []
+    for id in range(1, count + 1):
+        if rng.random() < revision_share:
+            status = rng.choice(("Minor revision", "Major revision"))
+        else:
+            status = rng.choice(
+                [s.name for s in SubmissionStatus if not s.name.endswith("revision")]
+            )
+        submissions.append(
+            Paper(
+                id,
+                " ".join(rng.choices(WORDS, k=rng.randint(4, 10))).capitalize(),
+                False,
+                status,
+                rng.sample(people, rng.randint(1, 6)),
+                rng.sample(reviewers, 3),
+                rng.choice(metareviewers),
+                rng.choice(metareviewers),
+            )
+        )
+    revision_statuses = [s.name for s in RevisionStatus]
+    revisions = [
+        paper._replace(
+            id=count + i, revision=True, status=rng.choice(revision_statuses)
+        )
+        for i, paper in enumerate(
+            (paper for paper in submissions if paper.status.endswith("revision")), 1
+        )
+    ]
+    return submissions, revisions
+
+
+def text(rng: Random, sentences: int = 2) -> str:
+    return " ".join(
+        " ".join(rng.choices(WORDS, k=rng.randint(6, 14))).capitalize() + "."
+        for _ in range(sentences)
+    )
+
+
+def names(people: Iterable[Person], affiliation: bool = True) -> str:
+    return ";".join(
+        f"{person.name} ({person.organization})" if affiliation else person.name
+        for person in people
+    )
+
+
+def emails(people: Iterable[Person], primary: bool = False) -> str:
+    """The emails of people, CMT marks the primary contact with an asterisk"""
+    return ";".join(
+        person.email + ("*" if primary and i == 0 else "")
+        for i, person in enumerate(people)
+    )
+
+
+def paper_row(rng: Random, paper: Paper) -> Dict[str, Any]:
+    return {
+        "Paper ID": paper.id,
+        "Paper Title": paper.title,
+        "Abstract": text(rng, 5),
+        "Primary Contact Author Name": paper.authors[0].name,
+        "Primary Contact Author Email": paper.authors[0].email,
+        "Authors": names(paper.authors),
+        "Author Emails": emails(paper.authors, primary=True),
+        "Reviewers": names(paper.reviewers),
+        "Reviewer Emails": emails(paper.reviewers),
+        "MetaReviewers": names([paper.metareviewer]),
+        "MetaReviewer Emails": emails([paper.metareviewer]),
+        "SeniorMetaReviewers": names([paper.seniormetareviewer]),
+        "SeniorMetaReviewerEmails": emails([paper.seniormetareviewer]),
+        "Track Name": "Research Track",
+        "Primary Subject Area": rng.choice(SUBJECT_AREAS),
+        "Secondary Subject Areas": "; ".join(rng.sample(SUBJECT_AREAS, 2)),
+        "Conflicts": rng.randint(0, 40),
+        "Assigned": len(paper.reviewers),
+        "% Completed": 100.0,
+        "Bids": rng.randint(0, 30),
+        "Discussion": f"{rng.randint(0, 5)} (0)",
+        "Status": paper.status,
+        EMBARGO: "Agreement accepted",
+        "Q3 (Conflict)": "I have entered all conflicts",
+        "Q4 (Special category)": rng.choice(CATEGORIES),
+        "Q7 (Authors)": "Agreement accepted",
+        "Q8 (Availability and Reproducibility)": rng.choice(("Yes", "No", None)),
+    }
+
+
+def review_row(rng: Random, paper: Paper, reviewer: Person) -> Dict[str, Any]:
+    """A review with all questions asked for the kind of paper"""
+    row: Dict[str, Any] = {
+        "Paper ID": paper.id,
+        "Paper Title": paper.title,
+        "Reviewer Name": reviewer.name,
+        "Reviewer Email": reviewer.email,
+    }
+    columns = (
+        reviews.revision_mapping.columns
+        if paper.revision
+        else reviews.submission_mapping.columns
+    )
+    for column in columns:
+        row.setdefault(column, text(rng, 1))
+    if paper.revision:
+        row["Q1 (Final and Overall Recommendation)"] = rng.choice(("Accept", "Reject"))
+    else:
+        row["Q1 (Overall Rating)"] = rng.choice(RATINGS)
+        row["Q16 (Rate your confidence in this review.)"] = rng.choice(EXPERTISE)
+    return row
+
+
+def metareview_row(rng: Random, paper: Paper) -> Dict[str, Any]:
+    row: Dict[str, Any] = {
+        "Paper ID": paper.id,
+        "Paper Title": paper.title,
+        "Meta-Reviewer Name": paper.metareviewer.name,
+        "Meta-Reviewer Email": paper.metareviewer.email,
+    }
+    columns = (
+        metareviews.revision_mapping.columns
+        if paper.revision
+        else metareviews.submission_mapping.columns
+    )
+    for column in columns:
+        row.setdefault(column, text(rng, 1))
+    row["Q1 (Overall Rating)"] = paper.status
+    return row
+
+
+def write_export(
+    path: Path,
+    original: Tuple[List[str], Iterable[Dict[str, Any]]],
+    revision: Tuple[List[str], Iterable[Dict[str, Any]]],
+) -> None:
+    """
+    Write the rows of originals and revisions into sheets like CMT does.
+
+    Each sheet starts with its title, a skipped row, and the header of its kind.
+    Sheets exceeding Excel's row limit are continued in further sheets.
+    """
+    workbook = Workbook(write_only=True)
+    for title, (header, rows) in (
+        ("Research Track", original),
+        ("Research Track Revision", revision),
+    ):
+        for i, chunk in enumerate(chunked(rows, MAX_SHEET_ROWS), 1):
+            sheet = workbook.create_sheet(f"{title[15:] or 'Original'} {i}")
+            sheet.append([title])
+            sheet.append(["Generated by cmt_statistics_tool.benchmark"])
+            sheet.append(header)
+            for row in chunk:
+                sheet.append([row.get(column) for column in header])
+    workbook.save(path)
+
+
+def chunked(rows: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk: List[Any] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def generate(
+    directory: str, count: int, seed: int = 0, revision_share: float = 0.2
+) -> None:
+    """Write all exports for count original submissions into a directory"""
+    rng = Random(seed)
+    target = Path(directory)
+    target.mkdir(parents=True, exist_ok=True)
+
+    people = generate_people(rng, 2 * count + 50)
+    DataFrame(
+        {
+            "# First Name": [person.first_name for person in people],
+            "Middle Initial (optional)": [person.middle_initial for person in people],
+            "Last Name": [person.last_name for person in people],
+            "E-mail": [person.email for person in people],
+            "Organization": [person.organization for person in people],
+            "Country": [person.country for person in people],
+            "Google Scholar URL": "",
+            "Semantic Scholar URL": "",
+            "DBLP URL": "",
+            "Domain Conflicts": "",
+        }
+    ).to_csv(target / "people.txt", sep="\t", index=False)
+
+    submissions, revisions = generate_papers(rng, count, people, revision_share)
+    write_export(
+        target / "papers.xlsx",
+        (PAPER_HEADER, (paper_row(rng, paper) for paper in submissions)),
+        (PAPER_HEADER, (paper_row(rng, paper) for paper in revisions)),
+    )
+    reviewer = ["Paper ID", "Paper Title", "Reviewer Name", "Reviewer Email"]
+    write_export(
+        target / "reviews.xlsx",
+        (
+            header(reviewer, reviews.submission_mapping.columns),
+            (
+                review_row(rng, paper, person)
+                for paper in submissions
+                for person in paper.reviewers
+            ),
+        ),
+        (
+            header(reviewer, reviews.revision_mapping.columns),
+            (
+                review_row(rng, paper, person)
+                for paper in revisions
+                for person in paper.reviewers
+            ),
+        ),
+    )
+    metareviewer = [
+        "Paper ID",
+        "Paper Title",
+        "Meta-Reviewer Name",
+        "Meta-Reviewer Email",
+    ]
+    write_export(
+        target / "metareviews.xlsx",
+        (
+            header(metareviewer, metareviews.submission_mapping.columns),
+            (metareview_row(rng, paper) for paper in submissions),
+        ),
+        (
+            header(metareviewer, metareviews.revision_mapping.columns),
+            (metareview_row(rng, paper) for paper in revisions),
+        ),
+    )
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Mapping")
+    sheet.append(["Revision ID", "OriginalSubmission ID", "Revision Title"])
+    originals = (paper for paper in submissions if paper.status.endswith("revision"))
+    for revision, original in zip(revisions, originals):
+        sheet.append([revision.id, original.id, revision.title])
+    workbook.save(target / "mapping.xlsx")
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("directory", help="directory to write the exports to")
+    parser.add_argument("papers", type=int, help="number of original submissions")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate(args.directory, args.papers, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark the import on synthetic exports of increasing size.
+
+For every scale, exports are generated (or reused) in data/benchmark/<papers>, then
+imported into freshly created tables exactly like main does, with a cold parse cache.
+Every import runs in a fresh process, so its peak memory is not that of earlier runs.
+The metrics of each run are written to data/benchmark/results, see the metrics
+module, and summarized at the end.
+This drops all tables of the configured DB, please do not point it at real data.
+
+Usage: python -m cmt_statistics_tool.benchmark.ingest --papers 1000 10000 100000
+"""
+from argparse import ArgumentParser
+from asyncio import run
+from concurrent.futures import ProcessPoolExecutor
+from json import load
+from multiprocessing import get_context
+from pathlib import Path
+from shutil import rmtree
+from time import perf_counter
+from typing import List
+
+from uvloop import install
+
+from cmt_statistics_tool.benchmark.generate import generate
+from cmt_statistics_tool.helper import Checkpoints, PeopleRegistry
+from cmt_statistics_tool.insert.metrics import add_peak_memory
+from cmt_statistics_tool.insert.scheduler import run_loaders
+from cmt_statistics_tool.main import create_tables, finish_tables, get_loaders
+
+
+async def benchmark(
+    directory: Path, summary: Path, bulk: bool = False, shards: int = 1
+) -> None:
+    """Import the exports in a directory into new tables"""
+    await create_tables(drop=True, bare=bulk)
+    registry = await PeopleRegistry().load()
+    checkpoints = Checkpoints()
+    await checkpoints.clear()
+    with ProcessPoolExecutor(mp_context=get_context("spawn")) as pool:
+        await run_loaders(
+            get_loaders(
+                registry, pool, checkpoints, directory=str(directory), shards=shards
+            ),
+            checkpoints,
+            summary=str(summary),
+        )
+    add_peak_memory(str(summary))
+    await finish_tables(constraints=bulk)
+
+
+def import_exports(directory: Path, summary: Path, bulk: bool, shards: int) -> None:
+    """Run benchmark in its own event loop, in a fresh process"""
+    install()
+    run(benchmark(directory, summary, bulk, shards))
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--papers",
+        type=int,
+        nargs="+",
+        default=[1000, 10000],
+        help="numbers of original submissions to benchmark",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="add constraints and indexes only after inserting all data",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=4,
+        help="number of paper id ranges each large export is loaded in concurrently",
+    )
+    args = parser.parse_args()
+
+    results: List[str] = []
+    for papers in args.papers:
+        directory = Path(f"data/benchmark/{papers}")
+        if not (directory / "mapping.xlsx").exists():
+            print(f"Generating {papers} papers...", end=" ")
+            generate(str(directory), papers, args.seed)
+            print("done! ✅")
+        rmtree(directory / ".cache", ignore_errors=True)
+
+        print(f"Importing {papers} papers...")
+        summary = Path(f"data/benchmark/results/import_{papers}.json")
+        start = perf_counter()
+        process = get_context("spawn").Process(
+            target=import_exports,
+            args=(directory, summary, args.bulk, args.shards),
+        )
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            raise SystemExit(f"Importing {papers} papers failed")
+        total = perf_counter() - start
+        with open(summary) as f:
+            result = load(f)
+        rows = sum(loader["rows_written"] for loader in result["loaders"])
+        memory = result["peak_memory_mb"]
+        results.append(
+            f"{papers:>9} papers: {total:8.1f}s, {rows:>10} rows, "
+            f"{rows / total:8.0f} rows/s, peak {memory['importer']:.0f} MB "
+            f"importer, {memory['largest_parser']:.0f} MB largest parser"
+        )
+    print("\n".join(results))
+
+
+if __name__ == "__main__":
+    main()
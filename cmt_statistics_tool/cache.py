@@ -0,0 +1,63 @@
+"""
+Cache parsed export files as Parquet.
+
+Parsing the XLSX exports is by far the slowest step of an import.
+The parsed frames are stored in a .cache directory next to the export, keyed by the
+export's content hash and the parser's name and version.
+Please increase PARSER_VERSION whenever a parser changes its output.
+"""
+from hashlib import sha256
+from pathlib import Path
+from shutil import rmtree
+from typing import Any, Callable, Tuple
+
+from pandas import DataFrame, read_parquet
+from pyarrow import ArrowInvalid, ArrowTypeError
+
+PARSER_VERSION = 3
+
+
+def arrow_strings(df: DataFrame) -> DataFrame:
+    """Restore Arrow-backed strings, which Parquet loads as Python-backed ones"""
+    strings = df.select_dtypes("string").columns
+    return df.astype({column: "string[pyarrow]" for column in strings})
+
+
+def file_hash(path: str) -> str:
+    """Get the SHA-256 hex digest of a file's content"""
+    digest = sha256()
+    with open(path, "rb") as f:
+        while block := f.read(1 << 20):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cached(
+    parse: Callable[..., Tuple[DataFrame, ...]], path: str, *args: Any
+) -> Tuple[DataFrame, ...]:
+    """
+    Parse a file, or load the frames parsed before from the cache.
+
+    parse is called with the path and any further args.
+
+    Frames that cannot be stored as Parquet, e.g. because a column mixes numbers and
+    strings, are not cached.
+    """
+    key = f"{parse.__name__}-v{PARSER_VERSION}-{file_hash(path)}"
+    target = Path(path).parent / ".cache" / key
+    if target.is_dir():
+        files = sorted(target.glob("*.parquet"), key=lambda file: int(file.stem))
+        return tuple(arrow_strings(read_parquet(file)) for file in files)
+
+    frames = parse(path, *args)
+    # Write to a staging directory first, so an interrupted write is never loaded
+    staging = target.with_name(f"{key}-partial")
+    staging.mkdir(parents=True, exist_ok=True)
+    try:
+        for i, df in enumerate(frames):
+            df.to_parquet(staging / f"{i}.parquet")
+        staging.rename(target)
+    except (ArrowInvalid, ArrowTypeError) as e:
+        print(f"Not caching {path}: {e}")
+        rmtree(staging)
+    return frames
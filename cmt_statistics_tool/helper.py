@@ -1,49 +1,506 @@
-from typing import List, Optional, Tuple
+from asyncio import Lock
+from concurrent.futures import Executor
+from itertools import islice, repeat
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 
-from pandas import DataFrame, concat, read_excel
-from sqlalchemy.ext.asyncio import AsyncSession
+from openpyxl import load_workbook
+from openpyxl.worksheet._read_only import ReadOnlyWorksheet
+from pandas import DataFrame, Index, Series, StringDtype, concat
+from pandas.api.types import infer_dtype
+from pandas.util import hash_pandas_object
+from sqlalchemy import delete, func, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
 from sqlalchemy.future import select
 
-from cmt_statistics_tool.tables import People
+from cmt_statistics_tool.cache import cached
+from cmt_statistics_tool.insert.mapping import Mapping, fill_strings
+from cmt_statistics_tool.insert.metrics import current_metrics
+from cmt_statistics_tool.tables import Base, Checkpoint, People, RowHash, async_session
+from cmt_statistics_tool.tables.version import table_version
 
+T = TypeVar("T")
+# String columns with at most one distinct value per this many values are categorical
+CATEGORY_SHARE = 4
 
-def read_original_revision(path: str) -> Tuple[DataFrame, DataFrame]:
-    d = read_excel(path, sheet_name=None)
+
+def sheet_rows(
+    sheet: ReadOnlyWorksheet,
+) -> Tuple[bool, Tuple[Any, ...], Iterator[Tuple[Any, ...]]]:
+    """
+    Split a sheet of an export into its kind, header, and data rows.
+
+    Each sheet is classified as original or revision by its first cell, the third row
+    holds the header. Empty rows are skipped.
+    """
+    rows = sheet.iter_rows(values_only=True)
+    revision = str(next(rows)[0]).strip().endswith("Revision")
+    next(rows)
+    header = next(rows)
+    return (
+        revision,
+        header,
+        (row for row in rows if any(value is not None for value in row)),
+    )
+
+
+def compact_dtypes(df: DataFrame) -> DataFrame:
+    """
+    Store the string columns of a frame compactly, in place.
+
+    String columns with few distinct values, e.g. statuses, tracks and ratings,
+    become categorical, other text Arrow-backed strings. Columns of other or mixed
+    types, including numbers, are kept as they are.
+    """
+    for column in df.columns:
+        values = df[column]
+        if values.dtype != object and not isinstance(values.dtype, StringDtype):
+            continue
+        if values.dtype == object and infer_dtype(values, skipna=True) != "string":
+            continue
+        if values.nunique() * CATEGORY_SHARE <= values.count():
+            df[column] = values.astype(object).astype("category")
+        elif values.dtype == object:
+            df[column] = values.astype("string[pyarrow]")
+    return df
+
+
+def parse_sheet(path: str, index: int) -> Tuple[bool, DataFrame]:
+    """Parse a single sheet of an export, see sheet_rows and compact_dtypes"""
+    workbook = load_workbook(path, read_only=True)
+    try:
+        revision, header, rows = sheet_rows(workbook.worksheets[index])
+        return revision, compact_dtypes(DataFrame(list(rows), columns=header))
+    finally:
+        workbook.close()
+
+
+def parse_original_revision(
+    path: str, pool: Optional[Executor] = None
+) -> Tuple[DataFrame, DataFrame]:
+    """
+    Parse all original and all revision sheets of an export into one frame each.
+
+    With a pool, every sheet is parsed as a separate task in it. Columns are
+    compacted again after combining the sheets, as their categories differ.
+    """
+    workbook = load_workbook(path, read_only=True)
+    count = len(workbook.sheetnames)
+    workbook.close()
+    if pool is None:
+        sheets = map(parse_sheet, repeat(path), range(count))
+    else:
+        sheets = pool.map(parse_sheet, repeat(path), range(count))
     original: List[DataFrame] = []
     revision: List[DataFrame] = []
-    for df in d.values():
-        name = str(df.columns[0]).strip()
-        df.columns = df.iloc[1]
-        df.drop(df.index[:2], inplace=True)
-        if name.endswith("Revision"):
-            revision.append(df)
-        else:
-            original.append(df)
-    return concat(original), concat(revision)
+    for is_revision, df in sheets:
+        (revision if is_revision else original).append(df)
+    return (
+        compact_dtypes(concat(original, ignore_index=True))
+        if original
+        else DataFrame(),
+        compact_dtypes(concat(revision, ignore_index=True))
+        if revision
+        else DataFrame(),
+    )
+
+
+def read_original_revision(
+    path: str, pool: Optional[Executor] = None
+) -> Tuple[DataFrame, DataFrame]:
+    """Read the original and revision frames of an export, see cached"""
+    original, revision = cached(parse_original_revision, path, pool)
+    return original, revision
+
+
+def chunk_original_revision(
+    path: str, chunk_size: int = 1000, pool: Optional[Executor] = None
+) -> Iterator[Tuple[bool, DataFrame]]:
+    """
+    Read an export like read_original_revision, in chunks of at most chunk_size rows.
+
+    Yields whether a chunk belongs to the revisions and the chunk itself.
+    The sheets are read row by row in read-only mode, but the whole export is held in
+    memory: validating all exports before writing (see the validation module),
+    splitting them into shards by paper id ranges and the parse cache all need
+    complete frames.
+    """
+    for is_revision, df in zip((False, True), read_original_revision(path, pool)):
+        for start in range(0, len(df), chunk_size):
+            yield is_revision, df.iloc[start : start + chunk_size].reset_index(
+                drop=True
+            )
 
 
 def fillna_strs(df: DataFrame, columns: List[str], value: str = "") -> DataFrame:
     for column in columns:
-        df[column] = df[column].fillna(value).astype(str)
+        df[column] = fill_strings(df[column], value)
     return df
 
 
-async def get_or_add(
+async def insert_rows(
     session: AsyncSession,
-    name: str,
-    email: str,
-    affiliation: str,
-    country: Optional[str] = None,
-) -> People:
-    if (
-        result := (
+    table: Type[Base],
+    rows: List[Dict[str, Any]],
+    upsert: bool = False,
+) -> None:
+    """
+    Insert rows with as few multi-row INSERT statements as possible.
+
+    With upsert, rows conflicting on the primary key update the existing rows.
+    """
+    if not rows:
+        return
+    metrics = current_metrics()
+    primary_key = [column.name for column in table.__table__.primary_key]
+    # PostgreSQL allows at most 32767 bind parameters per statement
+    size = 32767 // len(rows[0])
+    for start in range(0, len(rows), size):
+        statement = insert(table).values(rows[start : start + size])
+        if upsert:
+            statement = statement.on_conflict_do_update(
+                index_elements=primary_key,
+                set_={
+                    name: statement.excluded[name]
+                    for name in rows[0]
+                    if name not in primary_key
+                },
+            )
+        async with metrics.db():
+            await session.execute(statement)
+
+
+async def bump_versions(
+    session: Union[AsyncSession, AsyncConnection], *names: str
+) -> None:
+    """Log writes to the named tables in the writing transaction, see table_version"""
+    async with current_metrics().db():
+        await session.execute(
+            insert(table_version).values([{"table_name": name} for name in names])
+        )
+
+
+class Shard(NamedTuple):
+    number: int
+    # The paper id range [low, high), unbounded if None
+    low: Optional[int]
+    high: Optional[int]
+    chunks: List[Tuple[bool, DataFrame]]
+
+
+def shard_chunks(chunks: Iterable[Tuple[bool, DataFrame]], shards: int) -> List[Shard]:
+    """
+    Split chunks (see chunk_original_revision) into shards by paper id ranges.
+
+    The ranges are contiguous and cover all ids, so all rows of a paper end up in the
+    same shard. They are chosen to hold about the same number of rows each.
+    """
+    chunks = list(chunks)
+    ids = sorted(int(id) for _, df in chunks for id in df["Paper ID"])
+    bounds = Index(
+        sorted({ids[len(ids) * i // shards] for i in range(1, shards) if ids})
+    )
+    edges: List[Optional[int]] = [None, *bounds, None]
+    parts: List[List[Tuple[bool, DataFrame]]] = [[] for _ in edges[1:]]
+    for is_revision, df in chunks:
+        positions = bounds.searchsorted(df["Paper ID"], side="right")
+        for position, part in df.groupby(positions):
+            parts[position].append((is_revision, part.reset_index(drop=True)))
+    return [
+        Shard(number, low, high, part)
+        for number, (low, high, part) in enumerate(zip(edges, edges[1:], parts))
+    ]
+
+
+def hash_rows(df: DataFrame) -> List[int]:
+    """Hash the content of each row of a frame, ignoring the index"""
+    return list(hash_pandas_object(df, index=False).to_numpy().view("int64"))
+
+
+class RowHashes:
+    """
+    Content hashes of the source rows imported into a table.
+
+    Rows are keyed by their paper id and, for tables with one row per person and
+    paper, the person's id. Comparing the hashes of a new export with the stored ones
+    tells which rows are new or changed and which are gone.
+    With a shard, only the rows of the shard's paper id range are considered.
+    """
+
+    def __init__(self, table: Type[Base], shard: Optional["Shard"] = None) -> None:
+        self.table_name: str = table.__tablename__
+        self.shard = shard
+        self.stored: Dict[Tuple[int, int], int] = {}
+        self.unseen: Set[Tuple[int, int]] = set()
+        self.pending: List[Dict[str, Any]] = []
+
+    async def load(self, session: AsyncSession) -> "RowHashes":
+        """Load the hashes stored by the last import"""
+        statement = select(RowHash.paper_id, RowHash.people_id, RowHash.hash).where(
+            RowHash.table_name == self.table_name
+        )
+        if self.shard is not None and self.shard.low is not None:
+            statement = statement.where(RowHash.paper_id >= self.shard.low)
+        if self.shard is not None and self.shard.high is not None:
+            statement = statement.where(RowHash.paper_id < self.shard.high)
+        for paper_id, people_id, hash in (await session.execute(statement)).fetchall():
+            self.stored[paper_id, people_id] = hash
+        self.unseen = set(self.stored)
+        return self
+
+    def changed(
+        self,
+        hashes: List[int],
+        paper_ids: Iterable[int],
+        people_ids: Optional[Iterable[int]] = None,
+    ) -> List[bool]:
+        """Mark the rows that are new or changed, remembering their new hashes"""
+        keys = list(zip(paper_ids, repeat(0) if people_ids is None else people_ids))
+        self.unseen.difference_update(keys)
+        changed = []
+        for (paper_id, people_id), hash in zip(keys, hashes):
+            changed.append(self.stored.get((paper_id, people_id)) != hash)
+            if changed[-1]:
+                self.pending.append(
+                    {
+                        "table_name": self.table_name,
+                        "paper_id": int(paper_id),
+                        "people_id": int(people_id),
+                        "hash": int(hash),
+                    }
+                )
+        return changed
+
+    async def flush(self, session: AsyncSession) -> None:
+        """
+        Store the hashes of all new or changed rows.
+
+        Only changed rows need an upsert, so no unique index is needed for new rows.
+        """
+        pending, self.pending = self.pending, []
+        upsert = any(
+            (row["paper_id"], row["people_id"]) in self.stored for row in pending
+        )
+        await insert_rows(session, RowHash, pending, upsert=upsert)
+
+    async def delete_unseen(self, session: AsyncSession) -> List[Tuple[int, int]]:
+        """
+        Delete the hashes of all rows missing from the export.
+
+        Returns the keys of these rows, so the rows themselves can be deleted.
+        """
+        unseen, self.unseen = list(self.unseen), set()
+        if unseen:
             await session.execute(
-                select(People).filter_by(name=name, email=email).limit(1)
+                delete(RowHash).where(
+                    RowHash.table_name == self.table_name,
+                    tuple_(RowHash.paper_id, RowHash.people_id).in_(unseen),
+                )
             )
-        ).fetchone()
-    ) is None:
-        p = People(name=name, email=email, affiliation=affiliation, country=country)
-        session.add(p)
-    else:
-        p = result[0]
-    return p
+        return unseen
+
+
+def person_key(name: str, email: str) -> Tuple[str, str]:
+    """Normalize a name and an email to the key identifying a person."""
+    return " ".join(name.split()), email.strip().strip("*").lower()
+
+
+class PeopleRegistry:
+    """
+    Identity map of all people, keyed by normalized name and email.
+
+    The registry is preloaded with a single query and hands out ids for new people.
+    New people are written in bulk by flush, so the number of lookups does not grow
+    with the number of rows. All insert modules should share one registry.
+    """
+
+    def __init__(self) -> None:
+        self.ids: Dict[Tuple[str, str], int] = {}
+        self.pending: List[Dict[str, Any]] = []
+        self.next_id = 1
+        self.lock = Lock()
+
+    async def load(self) -> "PeopleRegistry":
+        """Load all existing people from the DB"""
+        statement = select(People.id, People.name, People.email)
+        async with async_session() as session:
+            result = (await session.execute(statement)).fetchall()
+        for id, name, email in result:
+            self.ids.setdefault(person_key(name, email), id)
+            self.next_id = max(self.next_id, id + 1)
+        return self
+
+    def get_or_add(
+        self,
+        name: str,
+        email: str,
+        affiliation: str,
+        country: Optional[str] = None,
+    ) -> int:
+        """Get the id of a person, registering them as new if unknown"""
+        key = person_key(name, email)
+        if (id := self.ids.get(key)) is None:
+            id = self.ids[key] = self.next_id
+            self.next_id += 1
+            self.pending.append(
+                {
+                    "id": id,
+                    "name": name,
+                    "email": email,
+                    "affiliation": affiliation,
+                    "country": country,
+                }
+            )
+        return id
+
+    async def flush(self, session: AsyncSession) -> None:
+        """Insert all new people in bulk and advance the id sequence"""
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        await insert_rows(session, People, pending)
+        await bump_versions(session, People.__tablename__)
+        await session.execute(
+            select(
+                func.setval(
+                    func.pg_get_serial_sequence("people", "id"), self.next_id - 1
+                )
+            )
+        )
+
+    async def commit(self) -> None:
+        """
+        Insert all new people in their own transaction.
+
+        Concurrent loaders may hand out ids of people that another loader is still
+        inserting. Waiting for the lock guarantees that all ids handed out so far
+        are committed, before rows referencing them are written.
+        """
+        async with self.lock:
+            async with async_session() as session:
+                async with current_metrics().transaction(session):
+                    await self.flush(session)
+
+
+class ResumeError(ValueError):
+    """The progress of an import with other parameters, see Checkpoints"""
+
+
+class Checkpoints:
+    """
+    Progress of the import stages, for resuming a failed import.
+
+    Chunked stages record how many chunks they committed in the same transaction as
+    the chunks themselves, so a resumed import continues at the first failed chunk.
+    The stages and chunks depend on parameters like the number of shards and the
+    chunk sizes. They are stored with the progress, which cannot be resumed with
+    other parameters.
+    """
+
+    def __init__(self, parameters: Optional[Dict[str, int]] = None) -> None:
+        self.parameters = ", ".join(
+            f"{name}={value}" for name, value in sorted((parameters or {}).items())
+        )
+        self.chunks: Dict[str, int] = {}
+        self.finished: Set[str] = set()
+
+    async def load(self) -> "Checkpoints":
+        """Load the progress of an earlier import with the same parameters"""
+        statement = select(
+            Checkpoint.stage,
+            Checkpoint.chunks,
+            Checkpoint.finished,
+            Checkpoint.parameters,
+        )
+        async with async_session() as session:
+            result = (await session.execute(statement)).fetchall()
+        for stage, chunks, finished, parameters in result:
+            if parameters != self.parameters:
+                raise ResumeError(
+                    f"{stage} was imported with {parameters or 'no parameters'}, "
+                    f"not {self.parameters or 'no parameters'}"
+                )
+            self.chunks[stage] = chunks
+            if finished:
+                self.finished.add(stage)
+        return self
+
+    async def clear(self) -> "Checkpoints":
+        """Delete the progress of an earlier import"""
+        async with async_session() as session:
+            async with session.begin():
+                await session.execute(delete(Checkpoint))
+        return self
+
+    def remaining(self, stage: str, chunks: Iterable[T]) -> Iterator[Tuple[int, T]]:
+        """Enumerate the chunks of a stage, skipping those committed before"""
+        return islice(enumerate(chunks), self.chunks.get(stage, 0), None)
+
+    async def save(
+        self, session: AsyncSession, stage: str, chunks: int = 0, finished: bool = False
+    ) -> None:
+        """Record the progress of a stage, without needing a unique index"""
+        await session.execute(delete(Checkpoint).where(Checkpoint.stage == stage))
+        await session.execute(
+            insert(Checkpoint).values(
+                stage=stage,
+                chunks=chunks,
+                finished=finished,
+                parameters=self.parameters,
+            )
+        )
+        self.chunks[stage] = chunks
+        if finished:
+            self.finished.add(stage)
+
+
+def register_people(
+    registry: PeopleRegistry,
+    names: Series,
+    emails: Series,
+    affiliations: Optional[Series] = None,
+    countries: Optional[Series] = None,
+) -> List[int]:
+    """Get the ids of all people given by a names and an emails column"""
+    return [
+        registry.get_or_add(name.strip(), email.strip(), affiliation, country)
+        for name, email, affiliation, country in zip(
+            names,
+            emails,
+            repeat("") if affiliations is None else affiliations,
+            repeat(None) if countries is None else countries,
+        )
+    ]
+
+
+async def copy_frame(session: AsyncSession, mapping: Mapping, df: DataFrame) -> None:
+    """
+    Stream a frame into the table of a mapping with a binary COPY.
+
+    The COPY bypasses SQLAlchemy, whose asyncpg adapter only sends BEGIN with the
+    first statement of a transaction. So the caller must have executed a statement in
+    the session's transaction before, otherwise the COPY would commit on its own.
+    """
+    connection = await (await session.connection()).get_raw_connection()
+    driver_connection = connection.driver_connection
+    if not driver_connection.is_in_transaction():
+        raise RuntimeError("COPY outside of a started transaction")
+    async with current_metrics().db():
+        await driver_connection.copy_records_to_table(
+            mapping.table.__tablename__,
+            records=mapping.tuples(df),
+            columns=list(mapping.columns.values()),
+        )
@@ -0,0 +1,192 @@
+"""
+Resolve the people rows of the same researcher into one identity.
+
+People are unique on their exact name and email, so a researcher appears several
+times if CMT spells their name differently or they use another email. Candidates
+are blocked on the email local-part, the email domain with the last name token, and
+the name tokens. Only people within a block are compared, by the similarity of their
+names, emails and affiliations, so the number of comparisons grows with the block
+sizes instead of the square of all people. Blocks larger than MAX_BLOCK_SIZE are too
+unspecific and skipped.
+Matches are merged transitively, so a single false match joins whole clusters. Names
+alone are thus never enough: a match also needs the same email or affiliation, and an
+email domain only counts for institutions, not for webmail providers.
+The resolved identities are written to the people_identity table, mapping every
+person to the smallest id of their identity.
+"""
+from asyncio import to_thread
+from difflib import SequenceMatcher
+from itertools import combinations
+from re import sub
+from typing import Dict, Hashable, Iterator, List, NamedTuple, Set, Tuple
+from unicodedata import combining, normalize
+
+from pandas import DataFrame
+from sqlalchemy import delete
+from sqlalchemy.future import select
+
+from cmt_statistics_tool.helper import bump_versions, copy_frame
+from cmt_statistics_tool.insert.mapping import Field, Mapping
+from cmt_statistics_tool.insert.metrics import current_metrics
+from cmt_statistics_tool.tables import People, PeopleIdentity, async_session
+
+MAX_BLOCK_SIZE = 100
+# Minimum name similarity of a match, by the evidence of the emails
+SAME_EMAIL = 0.6
+SAME_LOCAL_PART = 0.8
+SAME_DOMAIN = 0.9
+# Domains shared by unrelated people, which are no evidence of the same institution
+WEBMAIL_DOMAINS = frozenset(
+    {
+        "126.com",
+        "163.com",
+        "aol.com",
+        "gmail.com",
+        "gmx.de",
+        "gmx.net",
+        "googlemail.com",
+        "hotmail.com",
+        "icloud.com",
+        "live.com",
+        "mail.ru",
+        "me.com",
+        "outlook.com",
+        "protonmail.com",
+        "qq.com",
+        "web.de",
+        "yahoo.com",
+        "yandex.ru",
+    }
+)
+
+identity_mapping = Mapping(
+    PeopleIdentity,
+    [Field("people_id", "people_id"), Field("identity_id", "identity_id")],
+)
+
+
+class Candidate(NamedTuple):
+    id: int
+    name: str
+    local_part: str
+    domain: str
+    affiliation: str
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase a name, without accents and punctuation"""
+    decomposed = normalize("NFKD", name)
+    stripped = "".join(c for c in decomposed if not combining(c)).lower()
+    return " ".join(sub(r"[^\w]+", " ", stripped).split())
+
+
+def candidate(id: int, name: str, email: str, affiliation: str) -> Candidate:
+    """Normalize a person for comparison, ignoring +tags of email local-parts"""
+    local_part, _, domain = email.strip().strip("*").lower().rpartition("@")
+    return Candidate(
+        id,
+        normalize_name(name),
+        local_part.split("+")[0],
+        domain,
+        normalize_name(affiliation),
+    )
+
+
+def blocking_keys(person: Candidate) -> Iterator[Hashable]:
+    """Get the keys of all blocks a person is compared in"""
+    tokens = person.name.split()
+    if person.local_part:
+        yield "local_part", person.local_part
+    if tokens:
+        yield "domain", person.domain, tokens[-1]
+        yield "name", tuple(sorted(tokens))
+
+
+def same_person(a: Candidate, b: Candidate) -> bool:
+    """
+    Match two people by the similarity of their names, emails and affiliations.
+
+    Different researchers often share a name, so people with the same name tokens
+    still need the same email or affiliation. Similar names need the same email, the
+    same local-part and affiliation, or the same institutional domain and last name.
+    """
+    same_email = bool(a.local_part) and (a.local_part, a.domain) == (
+        b.local_part,
+        b.domain,
+    )
+    same_affiliation = bool(a.affiliation) and a.affiliation == b.affiliation
+    a_tokens, b_tokens = a.name.split(), b.name.split()
+    if sorted(a_tokens) == sorted(b_tokens):
+        return same_email or same_affiliation
+    similarity = SequenceMatcher(None, a.name, b.name).ratio()
+    if same_email:
+        return similarity >= SAME_EMAIL
+    if a.local_part and a.local_part == b.local_part:
+        return same_affiliation and similarity >= SAME_LOCAL_PART
+    return (
+        a.domain == b.domain
+        and bool(a.domain)
+        and a.domain not in WEBMAIL_DOMAINS
+        and a_tokens[-1:] == b_tokens[-1:]
+        and similarity >= SAME_DOMAIN
+    )
+
+
+def resolve_identities(people: DataFrame) -> DataFrame:
+    """
+    Map the ids of people to the smallest id of the same researcher.
+
+    people has the columns id, name, email and affiliation. Matches are merged
+    transitively.
+    """
+    blocks: Dict[Hashable, List[Candidate]] = {}
+    columns = ["id", "name", "email", "affiliation"]
+    for row in people[columns].itertuples(index=False, name=None):
+        person = candidate(*row)
+        for key in blocking_keys(person):
+            blocks.setdefault(key, []).append(person)
+
+    identity = {id: id for id in people["id"]}
+
+    def find(id: int) -> int:
+        while identity[id] != id:
+            identity[id] = identity[identity[id]]
+            id = identity[id]
+        return id
+
+    compared: Set[Tuple[int, int]] = set()
+    for block in blocks.values():
+        if len(block) > MAX_BLOCK_SIZE:
+            continue
+        for a, b in combinations(block, 2):
+            pair = (min(a.id, b.id), max(a.id, b.id))
+            if pair in compared:
+                continue
+            compared.add(pair)
+            if same_person(a, b):
+                first, second = sorted((find(a.id), find(b.id)))
+                identity[second] = first
+    return DataFrame(
+        {"people_id": list(identity), "identity_id": [find(id) for id in identity]}
+    )
+
+
+async def insert_identities() -> None:
+    """Resolve the identities of all people and replace the people_identity table"""
+    metrics = current_metrics()
+    async with async_session() as session:
+        result = await session.execute(
+            select(People.id, People.name, People.email, People.affiliation)
+        )
+        people = DataFrame(
+            result.fetchall(), columns=["id", "name", "email", "affiliation"]
+        )
+    metrics.rows_read += len(people)
+    identities = await to_thread(resolve_identities, people)
+    async with async_session() as session:
+        async with metrics.transaction(session):
+            async with metrics.db():
+                await session.execute(delete(PeopleIdentity))
+            await copy_frame(session, identity_mapping, identities)
+            await bump_versions(session, PeopleIdentity.__tablename__)
+    metrics.rows_written += len(identities)
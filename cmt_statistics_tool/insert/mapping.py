@@ -0,0 +1,99 @@
+"""
+Declarative mappings of export columns to table columns.
+
+Each insert module declares the fields it reads from an export: the export column,
+the table column it is inserted into, and the value missing entries are filled with.
+A mapping is compiled into positional column selections once per export header, so
+rows are handled by vectorized frame operations instead of per-row lookups of the
+long question headers.
+"""
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
+
+from pandas import CategoricalDtype, DataFrame, Index, Series, StringDtype
+
+from cmt_statistics_tool.tables import Base
+
+
+def fill_strings(values: Series, value: str) -> Series:
+    """Replace missing values and convert all to strings, keeping compact dtypes"""
+    if isinstance(values.dtype, CategoricalDtype):
+        if value not in values.cat.categories:
+            values = values.cat.add_categories(value)
+        return values.fillna(value)
+    if isinstance(values.dtype, StringDtype):
+        return values.fillna(value)
+    return values.fillna(value).astype(str)
+
+
+def python_values(df: DataFrame) -> DataFrame:
+    """Convert compact string columns to objects, with None for missing values"""
+    compact = df.select_dtypes(["category", "string"]).columns
+    if compact.empty:
+        return df
+    df = df.astype({column: object for column in compact})
+    df[compact] = df[compact].where(df[compact].notna(), None)
+    return df
+
+
+class Field(NamedTuple):
+    source: str
+    # Fields without a target are prepared, but not inserted
+    target: Optional[str] = None
+    # Missing values are replaced by this and all values converted to strings
+    fillna: Optional[str] = None
+
+
+class Mapping:
+    """The fields of an export inserted into a table"""
+
+    def __init__(self, table: Type[Base], fields: Sequence[Field]) -> None:
+        self.table = table
+        self.columns = {
+            field.source: field.target for field in fields if field.target is not None
+        }
+        self.fillna = {
+            field.source: field.fillna for field in fields if field.fillna is not None
+        }
+        self._positions: Dict[Tuple[Any, ...], List[int]] = {}
+
+    def target(self, source: str) -> Any:
+        """Get the table column a source column is inserted into"""
+        return getattr(self.table, self.columns[source])
+
+    def positions(self, header: Index) -> List[int]:
+        """Get the positions of the mapped columns in a header, compiled once"""
+        key = tuple(header)
+        if key not in self._positions:
+            positions = header.get_indexer(list(self.columns))
+            missing = [s for s, p in zip(self.columns, positions) if p < 0]
+            if missing:
+                raise KeyError(f"{self.table.__tablename__} columns missing: {missing}")
+            self._positions[key] = list(positions)
+        return self._positions[key]
+
+    def prepare(self, df: DataFrame) -> DataFrame:
+        """Apply the fill rules to a frame in place"""
+        for source, value in self.fillna.items():
+            df[source] = fill_strings(df[source], value)
+        return df
+
+    def tuples(self, df: DataFrame) -> Iterator[Tuple[Any, ...]]:
+        """Get the mapped values of all rows, in the order of columns"""
+        selected = python_values(df.iloc[:, self.positions(df.columns)])
+        rows: Iterator[Tuple[Any, ...]] = selected.itertuples(index=False, name=None)
+        return rows
+
+    def records(self, df: DataFrame) -> List[Dict[str, Any]]:
+        """Get all rows as parameters of an insert into the table"""
+        targets = list(self.columns.values())
+        return [dict(zip(targets, row)) for row in self.tuples(df)]
@@ -1,55 +1,64 @@
 """
 Insert the metareviews file into the DB.
 """
-from tqdm import tqdm
+from typing import Iterable, Optional, Tuple
 
-from cmt_statistics_tool.helper import fillna_strs, get_or_add, read_original_revision
-from cmt_statistics_tool.tables import (
-    RevisionMetareview,
+from pandas import DataFrame
+
+from cmt_statistics_tool.helper import Checkpoints, PeopleRegistry
+from cmt_statistics_tool.insert.mapping import Field, Mapping
+from cmt_statistics_tool.insert.review_shards import insert_review_chunks
+from cmt_statistics_tool.tables import RevisionMetareview, SubmissionMetareview
+
+submission_mapping = Mapping(
     SubmissionMetareview,
-    async_session,
+    [
+        Field("Reviewer ID", "reviewer_id"),
+        Field("Paper ID", "submission_id"),
+        Field("Q1 (Overall Rating)", "overall_rating"),
+        Field("Q2 (Summary Comments)", "summary"),
+        Field("Q3 (Revision Items)", "revision_items", fillna=""),
+    ],
 )
 
+revision_mapping = Mapping(
+    RevisionMetareview,
+    [
+        Field("Reviewer ID", "reviewer_id"),
+        Field("Paper ID", "revision_id"),
+        Field("Q1 (Overall Rating)", "overall_rating"),
+        Field("Q2 (Detailed Comments)", "comments"),
+    ],
+)
+
+
+async def insert_metareviews(
+    chunks: Iterable[Tuple[bool, DataFrame]],
+    registry: Optional[PeopleRegistry] = None,
+    incremental: bool = False,
+    checkpoints: Optional[Checkpoints] = None,
+    shards: int = 1,
+) -> None:
+    """
+    Insert all metareviews on submissions and revisions.
 
-async def insert_metareviews(file: str) -> None:
-    original, revision = read_original_revision(file)
-    original = fillna_strs(original, ["Q3 (Revision Items)"])
-    revision = fillna_strs(revision, [])
-    async with async_session() as session:
-        for _, row in tqdm(  # Insert all metareviews on submissions
-            original.iterrows(), desc="MetaReviews Submissions", total=len(original)
-        ):
-            async with session.begin():
-                submission = SubmissionMetareview(
-                    reviewer=(
-                        await get_or_add(
-                            session,
-                            row["Meta-Reviewer Name"].strip(),
-                            row["Meta-Reviewer Email"].strip(),
-                            "",
-                        )
-                    ),
-                    submission_id=row["Paper ID"],
-                    overall_rating=row["Q1 (Overall Rating)"],
-                    summary=row["Q2 (Summary Comments)"],
-                    revision_items=row["Q3 (Revision Items)"],
-                )
-                session.add(submission)
-        for _, row in tqdm(  # Insert all metareviews on revisions
-            revision.iterrows(), desc="MetaReviews Revisions", total=len(revision)
-        ):
-            async with session.begin():
-                revision = RevisionMetareview(
-                    reviewer=(
-                        await get_or_add(
-                            session,
-                            row["Meta-Reviewer Name"].strip(),
-                            row["Meta-Reviewer Email"].strip(),
-                            "",
-                        )
-                    ),
-                    revision_id=row["Paper ID"],
-                    overall_rating=row["Q1 (Overall Rating)"],
-                    comments=row["Q2 (Detailed Comments)"],
-                )
-                session.add(revision)
+    Each chunk (see chunk_original_revision) is copied in its own transaction.
+    The next chunks are prepared in worker threads meanwhile, see the pipeline module.
+    Chunks committed before according to the checkpoints are skipped.
+    New reviewers are committed first, so concurrent loaders can reference them.
+    With incremental, new and changed metareviews are upserted, unchanged ones are
+    skipped, and metareviews missing from the export are deleted.
+    With shards, the chunks are split by paper id ranges (see shard_chunks) and the
+    shards are inserted concurrently, each in its own session.
+    """
+    await insert_review_chunks(
+        "metareviews",
+        chunks,
+        submission_mapping,
+        revision_mapping,
+        ("Meta-Reviewer Name", "Meta-Reviewer Email"),
+        registry,
+        incremental,
+        checkpoints,
+        shards,
+    )
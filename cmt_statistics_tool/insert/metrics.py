@@ -0,0 +1,116 @@
+"""
+Throughput metrics of the insert modules.
+
+The scheduler runs every loader with its own LoaderMetrics, available to the insert
+modules and helpers through current_metrics. After an import, a JSON summary of all
+loaders is written, to compare runs against each other. Once the parse pool has
+exited, the peak memory of the import is added to it, see add_peak_memory.
+"""
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from json import dump, load
+from pathlib import Path
+from resource import RUSAGE_CHILDREN, RUSAGE_SELF, getrusage
+from time import perf_counter
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+@dataclass
+class LoaderMetrics:
+    name: str
+    rows_read: int = 0
+    rows_written: int = 0
+    parse_seconds: float = 0.0
+    insert_seconds: float = 0.0
+    # Time spent in writing statements, excluding commits
+    db_seconds: float = 0.0
+    commit_seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_written / self.insert_seconds if self.insert_seconds else 0.0
+
+    @asynccontextmanager
+    async def db(self) -> AsyncIterator[None]:
+        """Time a writing statement"""
+        start = perf_counter()
+        yield
+        self.db_seconds += perf_counter() - start
+
+    @asynccontextmanager
+    async def transaction(self, session: AsyncSession) -> AsyncIterator[None]:
+        """Begin a transaction like session.begin, timing its commit"""
+        transaction = await session.begin()
+        try:
+            yield
+        except BaseException:
+            await transaction.rollback()
+            raise
+        start = perf_counter()
+        await transaction.commit()
+        self.commit_seconds += perf_counter() - start
+
+    def summary(self) -> Dict[str, Any]:
+        return {**asdict(self), "rows_per_second": self.rows_per_second}
+
+
+_current: ContextVar[Optional[LoaderMetrics]] = ContextVar("metrics", default=None)
+
+
+def current_metrics() -> LoaderMetrics:
+    """Get the metrics of the running loader, or throwaway ones outside of loaders"""
+    metrics = _current.get()
+    return LoaderMetrics("unknown") if metrics is None else metrics
+
+
+def set_current_metrics(metrics: LoaderMetrics) -> None:
+    """Set the metrics of the running loader, for the current task only"""
+    _current.set(metrics)
+
+
+def write_summary(
+    path: str,
+    metrics: List[LoaderMetrics],
+    total_seconds: float,
+    critical_path: List[Tuple[str, float]],
+) -> None:
+    """Write the metrics of all loaders of a run as JSON"""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        dump(
+            {
+                "total_seconds": total_seconds,
+                "critical_path": [
+                    {"step": step, "seconds": seconds}
+                    for step, seconds in critical_path
+                ],
+                "loaders": [loader.summary() for loader in metrics],
+            },
+            f,
+            indent=2,
+        )
+
+
+def peak_memory() -> Dict[str, float]:
+    """
+    Get the peak resident memory in MB of this process and of its largest child.
+
+    Both are high-water marks over the lifetime of this process. Children only count
+    once they have exited, so the parse pool has to be shut down first.
+    """
+    return {
+        "importer": getrusage(RUSAGE_SELF).ru_maxrss / 1024,
+        "largest_parser": getrusage(RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def add_peak_memory(path: str) -> None:
+    """Add the peak memory to the summary of a run, after its parse pool exited"""
+    with open(path) as f:
+        summary = load(f)
+    summary["peak_memory_mb"] = peak_memory()
+    with open(path, "w") as f:
+        dump(summary, f, indent=2)
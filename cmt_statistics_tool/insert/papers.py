@@ -1,15 +1,30 @@
 """
 Insert the papers file into the DB.
 """
+from asyncio import gather
 from re import compile as re_compile
-from typing import List, Tuple
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Type, Union
 
+from pandas import DataFrame, concat
+from sqlalchemy import delete, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from tqdm import tqdm
 
-from cmt_statistics_tool.helper import fillna_strs, get_or_add, read_original_revision
+from cmt_statistics_tool.helper import (
+    Checkpoints,
+    PeopleRegistry,
+    RowHashes,
+    Shard,
+    bump_versions,
+    hash_rows,
+    insert_rows,
+    register_people,
+    shard_chunks,
+)
+from cmt_statistics_tool.insert.mapping import Field, Mapping
+from cmt_statistics_tool.insert.metrics import current_metrics
+from cmt_statistics_tool.insert.pipeline import pipeline
 from cmt_statistics_tool.tables import (
-    People,
+    Base,
     Revision,
     RevisionPeople,
     Submission,
@@ -18,215 +33,259 @@ from cmt_statistics_tool.tables import (
 )
 from cmt_statistics_tool.tables.people import PeoplePaperRelation as ppr
 
-name_affiliation_pattern = re_compile(r"(?P<name>[^(]*) \((?P<affiliation>.*)\)")
+Paper = Union[Type[Submission], Type[Revision]]
+PAPERS: Tuple[Paper, ...] = (Submission, Revision)
+name_affiliation_pattern = re_compile(r"^(?P<name>[^(]*) \((?P<affiliation>.*)\)")
+
+paper_fields = [
+    Field("Paper ID", "id"),
+    Field("Paper Title", "title"),
+    Field("Abstract", "abstract", fillna=""),
+    Field("Primary Author ID", "primary_author_id"),
+    Field("Track Name", "track_name"),
+    Field("Primary Subject Area", "primary_subject_area", fillna=""),
+    Field("Secondary Subject Areas", "secondary_subject_areas", fillna=""),
+    Field("Conflicts", "conflicts"),
+    Field("Assigned", "assigned"),
+    Field("% Completed", "completed"),
+    Field("Bids", "bids"),
+    Field("Discussion", "discussion"),
+    Field("Status", "status"),
+    Field(
+        "Q1 (PVLDB does not allow papers previously rejected from PVLDB to be resubmitted within 12 months of the original submission date.)",
+        "embargo_agreement",
+    ),
+    Field("Q3 (Conflict)", "conflict_agreement"),
+    Field("Q4 (Special category)", "category"),
+    Field("Q7 (Authors)", "authors_agreement"),
+    Field("Q8 (Availability and Reproducibility)", "availability", fillna=""),
+    Field("Reviewers", fillna=""),
+    Field("Reviewer Emails", fillna=""),
+    Field("MetaReviewers", fillna=""),
+    Field("MetaReviewer Emails", fillna=""),
+    Field("SeniorMetaReviewers", fillna=""),
+    Field("SeniorMetaReviewerEmails", fillna=""),
+]
+paper_mappings = {paper: Mapping(paper, paper_fields) for paper in PAPERS}
+people_columns = (
+    ("Authors", "Author Emails", ppr.AUTHOR),
+    ("Reviewers", "Reviewer Emails", ppr.REVIEWER),
+    ("MetaReviewers", "MetaReviewer Emails", ppr.METAREVIEWER),
+    ("SeniorMetaReviewers", "SeniorMetaReviewerEmails", ppr.SENIORMETAREVIEWER),
+)
 
 
-def separate_name_affiliation_email(
-    names_and_affiliations: str, emails: str
-) -> Tuple[Tuple[str, str, str], ...]:
+def separate_people(df: DataFrame) -> DataFrame:
     """
-    Separate a string containing names and affiliations and a string containing emails.
+    Separate all people columns of a papers frame into one long frame.
 
-    The resulting format is name, affiliation, email.
+    Names with affiliations and emails are split on ";" and paired by their position.
+    The resulting columns are paper_id, relation_type, position, name, affiliation,
+    email. Entries without an affiliation are dropped and do not count as a position.
     """
-    result = []
-    for name, email in zip(
-        names_and_affiliations.strip().split(";"), emails.strip().split(";")
-    ):
-        if (res := name_affiliation_pattern.match(name.strip())) is not None:
-            result.append(
-                (
-                    res.group("name").strip(),
-                    res.group("affiliation").strip(),
-                    email.strip().strip("*"),
-                )
+    df = df.reset_index(drop=True)
+    frames = []
+    for names, emails, relation_type in people_columns:
+        entries = [
+            df[column]
+            .str.strip()
+            .str.split(";")
+            .explode()
+            .to_frame(key)
+            .assign(entry=lambda x: x.groupby(level=0).cumcount())
+            .set_index("entry", append=True)
+            for column, key in ((names, "names"), (emails, "email"))
+        ]
+        frame = entries[0].join(entries[1], how="inner")
+        frame = frame.join(
+            frame.pop("names").str.strip().str.extract(name_affiliation_pattern)
+        ).dropna(subset=["name"])
+        frame = frame.reset_index(level="entry", drop=True)
+        frames.append(
+            DataFrame(
+                {
+                    "paper_id": df["Paper ID"].reindex(frame.index),
+                    "relation_type": relation_type,
+                    "position": frame.groupby(level=0).cumcount(),
+                    "name": frame["name"].str.strip(),
+                    "affiliation": frame["affiliation"].str.strip(),
+                    "email": frame["email"].str.strip().str.strip("*"),
+                }
             )
-    return tuple(result)
+        )
+    return concat(frames, ignore_index=True)
+
+
+async def delete_papers(
+    session: AsyncSession,
+    paper: Paper,
+    ids: List[int],
+) -> None:
+    """Delete papers and all rows referencing them; nullable references are cleared"""
+    changed = []
+    for table in reversed(Base.metadata.sorted_tables):
+        for column in table.columns:
+            if any(key.column.table is paper.__table__ for key in column.foreign_keys):
+                await session.execute(
+                    update(table).where(column.in_(ids)).values({column.name: None})
+                    if column.nullable
+                    else delete(table).where(column.in_(ids))
+                )
+                changed.append(table.name)
+    await session.execute(delete(paper).where(paper.__table__.c.id.in_(ids)))
+    await bump_versions(session, *changed, paper.__tablename__)
+
+
+class PaperChunk(NamedTuple):
+    paper: Paper
+    # The content hashes of the rows as exported
+    hashes: List[int]
+    df: DataFrame
+    people: DataFrame
+
 
+def prepare_chunk(paper: Paper, df: DataFrame) -> PaperChunk:
+    """Hash a chunk of papers, fill its missing values and separate its people"""
+    row_hashes = hash_rows(df)
+    df = paper_mappings[paper].prepare(df.copy())
+    return PaperChunk(paper, row_hashes, df, separate_people(df))
 
-async def extract_and_add_people(
-    session: AsyncSession, names: str, emails: str
-) -> List[Tuple[int, People]]:
+
+async def insert_chunk(
+    session: AsyncSession,
+    registry: PeopleRegistry,
+    chunk: PaperChunk,
+    hashes: RowHashes,
+    incremental: bool = False,
+) -> None:
     """
-    Given a string of names with affiliations and a string of emails,
-    separate them into their components, add all non-existent people to the DB
-    and return all people.
+    Insert a chunk of papers and their people mappings with multi-row inserts.
+
+    Unchanged papers are skipped. When importing incrementally, changed papers are
+    upserted and their people mappings are replaced.
+    New people are committed first, so concurrent shards can reference them.
     """
-    return [
-        (position, await get_or_add(session, name, email, affiliation))
-        for position, (name, affiliation, email) in enumerate(
-            separate_name_affiliation_email(names, emails)
-        )
-    ]
-
-
-async def insert_papers(file: str) -> None:
-    original, revision = read_original_revision(file)
-    original = fillna_strs(
-        original,
-        [
-            "Abstract",
-            "Primary Subject Area",
-            "Secondary Subject Areas",
-            "Reviewers",
-            "Reviewer Emails",
-            "MetaReviewers",
-            "MetaReviewer Emails",
-            "SeniorMetaReviewers",
-            "SeniorMetaReviewerEmails",
-            "Q8 (Availability and Reproducibility)",
-        ],
+    paper = chunk.paper
+    paper_people, paper_id = (
+        (SubmissionPeople, "submission_id")
+        if paper == Submission
+        else (RevisionPeople, "revision_id")
     )
-    revision = fillna_strs(
-        revision,
-        [
-            "Abstract",
-            "Primary Subject Area",
-            "Secondary Subject Areas",
-            "Reviewers",
-            "Reviewer Emails",
-            "MetaReviewers",
-            "MetaReviewer Emails",
-            "SeniorMetaReviewers",
-            "SeniorMetaReviewerEmails",
-            "Q8 (Availability and Reproducibility)",
-        ],
+    metrics = current_metrics()
+    metrics.rows_read += len(chunk.df)
+    df = chunk.df[hashes.changed(chunk.hashes, chunk.df["Paper ID"])].copy()
+    if df.empty:
+        return
+    people = chunk.people[chunk.people["paper_id"].isin(df["Paper ID"])]
+    unique_people = people.drop_duplicates(["name", "email"])
+    people = people.merge(
+        unique_people[["name", "email"]].assign(
+            people_id=register_people(
+                registry,
+                unique_people["name"],
+                unique_people["email"],
+                unique_people["affiliation"],
+            )
+        ),
+        on=["name", "email"],
+    ).drop_duplicates(  # the first position of a person counts
+        ["people_id", "relation_type", "paper_id"]
     )
-    async with async_session() as session:
-        for _, row in tqdm(  # Add all submissions
-            original.iterrows(), desc="Submissions", total=len(original)
-        ):
-            async with session.begin():
-                authors = await extract_and_add_people(
-                    session, row["Authors"], row["Author Emails"]
-                )
-                reviewers = await extract_and_add_people(
-                    session, row["Reviewers"], row["Reviewer Emails"]
-                )
-                metareviewers = await extract_and_add_people(
-                    session, row["MetaReviewers"], row["MetaReviewer Emails"]
-                )
-                seniormetareviewers = await extract_and_add_people(
-                    session, row["SeniorMetaReviewers"], row["SeniorMetaReviewerEmails"]
-                )
-            async with session.begin():
-                submission = Submission(
-                    id=row["Paper ID"],
-                    title=row["Paper Title"],
-                    abstract=row["Abstract"],
-                    primary_author=(
-                        await get_or_add(
-                            session,
-                            row["Primary Contact Author Name"].strip(),
-                            row["Primary Contact Author Email"].strip(),
-                            "",
-                        )
-                    ),
-                    track_name=row["Track Name"],
-                    primary_subject_area=row["Primary Subject Area"],
-                    secondary_subject_areas=row["Secondary Subject Areas"],
-                    conflicts=row["Conflicts"],
-                    assigned=row["Assigned"],
-                    completed=row["% Completed"],
-                    bids=row["Bids"],
-                    discussion=row["Discussion"],
-                    status=row["Status"],
-                    embargo_agreement=row[
-                        "Q1 (PVLDB does not allow papers previously rejected from PVLDB to be resubmitted within 12 months of the original submission date.)"
-                    ],
-                    conflict_agreement=row["Q3 (Conflict)"],
-                    category=row["Q4 (Special category)"],
-                    authors_agreement=row["Q7 (Authors)"],
-                    availability=row["Q8 (Availability and Reproducibility)"],
-                )
-                session.add(submission)
-            async with session.begin():
-                session.add_all(
-                    [
-                        SubmissionPeople(
-                            people_id=people.id,
-                            position=position,
-                            relation_type=relation_type,
-                            submission_id=submission.id,
-                        )
-                        for peoples, relation_type in (
-                            (authors, ppr.AUTHOR),
-                            (reviewers, ppr.REVIEWER),
-                            (metareviewers, ppr.METAREVIEWER),
-                            (
-                                seniormetareviewers,
-                                ppr.SENIORMETAREVIEWER,
-                            ),
-                        )
-                        for position, people in set(peoples)
-                    ]
+    df["Primary Author ID"] = register_people(
+        registry,
+        df["Primary Contact Author Name"],
+        df["Primary Contact Author Email"],
+    )
+    await registry.commit()
+    await insert_rows(
+        session,
+        paper,
+        paper_mappings[paper].records(df),
+        upsert=incremental,
+    )
+    if incremental:
+        async with metrics.db():
+            await session.execute(
+                delete(paper_people).where(
+                    getattr(paper_people, paper_id).in_(df["Paper ID"].tolist())
                 )
+            )
+    await insert_rows(
+        session,
+        paper_people,
+        people[["people_id", "position", "relation_type", "paper_id"]]
+        .rename(columns={"paper_id": paper_id})
+        .to_dict("records"),
+    )
+    metrics.rows_written += len(df) + len(people)
+    await bump_versions(session, paper.__tablename__, paper_people.__tablename__)
+    await hashes.flush(session)
+
+
+async def insert_shard(
+    shard: Shard,
+    registry: PeopleRegistry,
+    checkpoints: Checkpoints,
+    incremental: bool = False,
+) -> None:
+    """Insert the papers of a shard, see insert_papers"""
+    stage = f"papers/{shard.number}"
+    metrics = current_metrics()
     async with async_session() as session:
-        for _, row in tqdm(  # Add all revisions
-            revision.iterrows(), desc="Revisions", total=len(revision)
-        ):
-            async with session.begin():
-                authors = await extract_and_add_people(
-                    session, row["Authors"], row["Author Emails"]
-                )
-                reviewers = await extract_and_add_people(
-                    session, row["Reviewers"], row["Reviewer Emails"]
-                )
-                metareviewers = await extract_and_add_people(
-                    session, row["MetaReviewers"], row["MetaReviewer Emails"]
-                )
-                seniormetareviewers = await extract_and_add_people(
-                    session, row["SeniorMetaReviewers"], row["SeniorMetaReviewerEmails"]
-                )
-            async with session.begin():
-                revision = Revision(
-                    id=row["Paper ID"],
-                    title=row["Paper Title"],
-                    abstract=row["Abstract"],
-                    primary_author=(
-                        await get_or_add(
-                            session,
-                            row["Primary Contact Author Name"].strip(),
-                            row["Primary Contact Author Email"].strip(),
-                            "",
-                        )
-                    ),
-                    track_name=row["Track Name"],
-                    primary_subject_area=row["Primary Subject Area"],
-                    secondary_subject_areas=row["Secondary Subject Areas"],
-                    conflicts=row["Conflicts"],
-                    assigned=row["Assigned"],
-                    completed=row["% Completed"],
-                    bids=row["Bids"],
-                    discussion=row["Discussion"],
-                    status=row["Status"],
-                    embargo_agreement=row[
-                        "Q1 (PVLDB does not allow papers previously rejected from PVLDB to be resubmitted within 12 months of the original submission date.)"
-                    ],
-                    conflict_agreement=row["Q3 (Conflict)"],
-                    category=row["Q4 (Special category)"],
-                    authors_agreement=row["Q7 (Authors)"],
-                    availability=row["Q8 (Availability and Reproducibility)"],
-                )
-                session.add(revision)
-            async with session.begin():
-                session.add_all(
-                    [
-                        RevisionPeople(
-                            people_id=people.id,
-                            position=position,
-                            relation_type=relation_type,
-                            revision_id=revision.id,
-                        )
-                        for peoples, relation_type in (
-                            (authors, ppr.AUTHOR),
-                            (reviewers, ppr.REVIEWER),
-                            (metareviewers, ppr.METAREVIEWER),
-                            (
-                                seniormetareviewers,
-                                ppr.SENIORMETAREVIEWER,
-                            ),
-                        )
-                        for position, people in set(peoples)
-                    ]
+        async with session.begin():
+            hashes: Dict[Paper, RowHashes] = {
+                paper: await RowHashes(paper, shard).load(session) for paper in PAPERS
+            }
+
+        def transform(
+            item: Tuple[int, Tuple[bool, DataFrame]]
+        ) -> Tuple[int, PaperChunk]:
+            index, (is_revision, df) = item
+            return index, prepare_chunk(Revision if is_revision else Submission, df)
+
+        async def write(item: Tuple[int, PaperChunk]) -> None:
+            index, chunk = item
+            async with metrics.transaction(session):
+                await insert_chunk(
+                    session, registry, chunk, hashes[chunk.paper], incremental
                 )
+                await checkpoints.save(session, stage, index + 1)
+
+        await pipeline(checkpoints.remaining(stage, shard.chunks), transform, write)
+        if incremental:
+            async with metrics.transaction(session):
+                for paper in reversed(PAPERS):  # revisions reference submissions
+                    gone = await hashes[paper].delete_unseen(session)
+                    if gone:
+                        async with metrics.db():
+                            await delete_papers(session, paper, [id for id, _ in gone])
+
+
+async def insert_papers(
+    chunks: Iterable[Tuple[bool, DataFrame]],
+    registry: Optional[PeopleRegistry] = None,
+    incremental: bool = False,
+    checkpoints: Optional[Checkpoints] = None,
+    shards: int = 1,
+) -> None:
+    """
+    Insert all submissions and revisions with their people.
+
+    Each chunk (see chunk_original_revision) is written in its own transaction.
+    The next chunks are prepared in worker threads meanwhile, see the pipeline module.
+    With incremental, only new and changed papers are written and papers missing
+    from the export are deleted.
+    Chunks committed before according to the checkpoints are skipped.
+    With shards, the chunks are split by paper id ranges (see shard_chunks) and the
+    shards are inserted concurrently, each in its own session.
+    """
+    if registry is None:
+        registry = await PeopleRegistry().load()
+    if checkpoints is None:
+        checkpoints = Checkpoints()
+    await gather(
+        *(
+            insert_shard(shard, registry, checkpoints, incremental)
+            for shard in shard_chunks(chunks, shards)
+        )
+    )
@@ -12,23 +12,37 @@ Semantic Scholar URL
 DBLP URL
 Domain Conflicts
 """
+from concurrent.futures import Executor
+from typing import Optional, Tuple, cast
 
-from pandas import Series, isna, read_csv
-from tqdm import tqdm
+from pandas import DataFrame, Series, read_csv
+from sqlalchemy import Integer, String, column, func, or_, update, values
+from sqlalchemy.engine import CursorResult
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from cmt_statistics_tool.helper import fillna_strs, get_or_add
-from cmt_statistics_tool.tables import async_session
+from cmt_statistics_tool.cache import cached
+from cmt_statistics_tool.helper import (
+    PeopleRegistry,
+    bump_versions,
+    fillna_strs,
+    register_people,
+)
+from cmt_statistics_tool.insert.metrics import current_metrics
+from cmt_statistics_tool.tables import People, async_session
 
 
-def agg_name(x: Series) -> str:
-    """Construct a name from its components."""
-    f_name = x["First Name"].strip()
-    m_name = x["Middle Initial (optional)"].strip()
-    l_name = x["Last Name"].strip()
-    return f"{f_name}{'' if m_name == '' else ' ' + m_name} {l_name}"
+def people_names(df: DataFrame) -> Series:
+    """Construct the names of all people from their components."""
+    f_name = df["First Name"].str.strip()
+    m_name = df["Middle Initial (optional)"].str.strip()
+    l_name = df["Last Name"].str.strip()
+    return f_name + m_name.where(m_name == "", " " + m_name) + " " + l_name
 
 
-async def insert_people(file: str) -> None:
+def parse_people(file: str, pool: Optional[Executor] = None) -> Tuple[DataFrame]:
+    """Parse the people file and construct all names, as a task in the pool if given."""
+    if pool is not None:
+        return pool.submit(parse_people, file).result()
     df = read_csv(file, sep="\t").rename(columns={"# First Name": "First Name"})
     df = fillna_strs(
         df,
@@ -40,18 +54,80 @@ async def insert_people(file: str) -> None:
         ],
     )
 
-    df["Name"] = df.agg(agg_name, axis=1)
+    df["Name"] = people_names(df)
+    return (df,)
+
+
+def read_people(file: str, pool: Optional[Executor] = None) -> DataFrame:
+    """Read the people file, see cached."""
+    (df,) = cached(parse_people, file, pool)
+    return df
+
+
+async def update_people(session: AsyncSession, df: DataFrame) -> int:
+    """
+    Fill in the affiliations and countries of known people, by their id.
+
+    Each batch is a single UPDATE ... FROM VALUES. Empty affiliations and missing
+    countries keep the stored values. Returns the number of people changed.
+    """
+    size = 10000
+    changed = 0
+    for start in range(0, len(df), size):
+        people = values(
+            column("id", Integer),
+            column("affiliation", String),
+            column("country", String),
+            name="people_update",
+            # Rendered inline, untyped parameters in VALUES would be text
+            literal_binds=True,
+        ).data(list(df.iloc[start : start + size].itertuples(index=False, name=None)))
+        affiliation = func.coalesce(
+            func.nullif(people.c.affiliation, ""), People.affiliation
+        )
+        country = func.coalesce(people.c.country, People.country)
+        statement = (
+            update(People)
+            .where(
+                People.id == people.c.id,
+                or_(
+                    People.affiliation.is_distinct_from(affiliation),
+                    People.country.is_distinct_from(country),
+                ),
+            )
+            .values(affiliation=affiliation, country=country)
+        )
+        async with current_metrics().db():
+            result = cast(CursorResult, await session.execute(statement))
+            changed += result.rowcount
+    return changed
+
+
+async def insert_people(
+    df: DataFrame, registry: Optional[PeopleRegistry] = None
+) -> None:
+    """
+    Insert all people of the people file, with their affiliation and country.
+
+    New people are inserted in bulk by the registry, people known from an earlier
+    import are updated in batches, see update_people.
+    """
+    if registry is None:
+        registry = await PeopleRegistry().load()
+    metrics = current_metrics()
+    metrics.rows_read += len(df)
+    countries = df["Country"].astype(object).where(df["Country"].notna(), None)
+    ids = register_people(
+        registry, df["Name"], df["E-mail"], df["Organization"], countries
+    )
+    new = {person["id"] for person in registry.pending}
+    known = DataFrame(
+        {"id": ids, "affiliation": df["Organization"], "country": countries}
+    )
+    known = known[~known["id"].isin(new)].drop_duplicates("id")
+    metrics.rows_written += len(new) + len(known)
     async with async_session() as session:
-        for _, row in tqdm(  # insert all people
-            df[["Name", "E-mail", "Organization", "Country"]].iterrows(),
-            desc="People",
-            total=len(df),
-        ):
-            async with session.begin():
-                await get_or_add(
-                    session,
-                    row["Name"],
-                    row["E-mail"],
-                    row["Organization"],
-                    country=row["Country"] if not isna(row["Country"]) else None,
-                )
+        async with metrics.transaction(session):
+            await registry.flush(session)
+            if await update_people(session, known):
+                await bump_versions(session, People.__tablename__)
@@ -0,0 +1,58 @@
+"""
+Pipelines of a reader, a transform and a writer stage, joined by bounded queues.
+
+The reader and transform stages run in worker threads, so preparing the next chunks
+overlaps with writing the current one, without blocking the event loop. The bounded
+queues limit how many prepared chunks are held in memory at once. The chunks of the
+exports are already in memory (see chunk_original_revision), so only the transform
+and the writes overlap, and memory is not bounded by the queues alone.
+"""
+from asyncio import Queue, create_task, gather, to_thread
+from typing import Awaitable, Callable, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+U = TypeVar("U")
+
+
+def next_item(items: Iterator[T]) -> Optional[T]:
+    """Get the next item, or None once there are no more"""
+    return next(items, None)
+
+
+async def pipeline(
+    source: Iterable[T],
+    transform: Callable[[T], U],
+    write: Callable[[U], Awaitable[None]],
+    maxsize: int = 2,
+) -> None:
+    """
+    Transform all items of a source and write them, in order.
+
+    Items are read and transformed in worker threads, at most maxsize items ahead of
+    the writer per queue. Items must not be None. If a stage fails, the pipeline is
+    cancelled and the error raised.
+    """
+    read: "Queue[Optional[T]]" = Queue(maxsize)
+    transformed: "Queue[Optional[U]]" = Queue(maxsize)
+    items = iter(source)
+
+    async def reader() -> None:
+        while (item := await to_thread(next_item, items)) is not None:
+            await read.put(item)
+        await read.put(None)
+
+    async def transformer() -> None:
+        while (item := await read.get()) is not None:
+            await transformed.put(await to_thread(transform, item))
+        await transformed.put(None)
+
+    async def writer() -> None:
+        while (item := await transformed.get()) is not None:
+            await write(item)
+
+    tasks = [create_task(stage()) for stage in (reader, transformer, writer)]
+    try:
+        await gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,144 @@
+"""
+Insert the shards of an export with one row per paper and reviewer into the DB.
+
+The reviews and metareviews files only differ in their tables, mappings and reviewer
+columns, so both are inserted by insert_review_chunks.
+"""
+from asyncio import gather
+from typing import Iterable, List, Optional, Tuple
+
+from pandas import DataFrame
+from sqlalchemy import delete, tuple_
+
+from cmt_statistics_tool.helper import (
+    Checkpoints,
+    PeopleRegistry,
+    RowHashes,
+    Shard,
+    bump_versions,
+    copy_frame,
+    hash_rows,
+    insert_rows,
+    register_people,
+    shard_chunks,
+)
+from cmt_statistics_tool.insert.mapping import Mapping
+from cmt_statistics_tool.insert.metrics import current_metrics
+from cmt_statistics_tool.insert.pipeline import pipeline
+from cmt_statistics_tool.tables import async_session
+
+
+async def insert_shard(
+    name: str,
+    shard: Shard,
+    submission_mapping: Mapping,
+    revision_mapping: Mapping,
+    reviewer_columns: Tuple[str, str],
+    registry: PeopleRegistry,
+    checkpoints: Checkpoints,
+    incremental: bool = False,
+) -> None:
+    """Insert the rows of a shard, see insert_review_chunks"""
+    stage = f"{name}/{shard.number}"
+    name_column, email_column = reviewer_columns
+    metrics = current_metrics()
+    async with async_session() as session:
+        async with session.begin():
+            hashes = {
+                mapping.table: await RowHashes(mapping.table, shard).load(session)
+                for mapping in (submission_mapping, revision_mapping)
+            }
+
+        def transform(
+            item: Tuple[int, Tuple[bool, DataFrame]]
+        ) -> Tuple[int, Mapping, List[int], DataFrame]:
+            index, (is_revision, df) = item
+            mapping = revision_mapping if is_revision else submission_mapping
+            row_hashes = hash_rows(df)
+            return index, mapping, row_hashes, mapping.prepare(df)
+
+        async def write(item: Tuple[int, Mapping, List[int], DataFrame]) -> None:
+            index, mapping, row_hashes, df = item
+            table = mapping.table
+            metrics.rows_read += len(df)
+            df["Reviewer ID"] = register_people(
+                registry, df[name_column], df[email_column]
+            )
+            await registry.commit()
+            changed = hashes[table].changed(
+                row_hashes, df["Paper ID"], df["Reviewer ID"]
+            )
+            if incremental:
+                df = df[changed]
+            async with metrics.transaction(session):
+                if not df.empty:
+                    # Also sends BEGIN, before copy_frame bypasses SQLAlchemy
+                    await bump_versions(session, table.__tablename__)
+                if incremental:
+                    await insert_rows(
+                        session,
+                        table,
+                        mapping.records(df),
+                        upsert=True,
+                    )
+                elif not df.empty:
+                    await copy_frame(session, mapping, df)
+                metrics.rows_written += len(df)
+                await hashes[table].flush(session)
+                await checkpoints.save(session, stage, index + 1)
+
+        await pipeline(checkpoints.remaining(stage, shard.chunks), transform, write)
+        if incremental:
+            async with metrics.transaction(session):
+                for mapping in (submission_mapping, revision_mapping):
+                    table = mapping.table
+                    gone = await hashes[table].delete_unseen(session)
+                    if gone:
+                        paper_id = mapping.target("Paper ID")
+                        reviewer_id = mapping.target("Reviewer ID")
+                        async with metrics.db():
+                            await session.execute(
+                                delete(table).where(
+                                    tuple_(paper_id, reviewer_id).in_(gone)
+                                )
+                            )
+                        await bump_versions(session, table.__tablename__)
+
+
+async def insert_review_chunks(
+    name: str,
+    chunks: Iterable[Tuple[bool, DataFrame]],
+    submission_mapping: Mapping,
+    revision_mapping: Mapping,
+    reviewer_columns: Tuple[str, str],
+    registry: Optional[PeopleRegistry] = None,
+    incremental: bool = False,
+    checkpoints: Optional[Checkpoints] = None,
+    shards: int = 1,
+) -> None:
+    """
+    Insert all rows of an export on submissions and revisions, by paper and reviewer.
+
+    The reviewers are registered from the name and email reviewer_columns, and the
+    progress is checkpointed in stages named after the export and shard.
+    See insert_reviews for the rest.
+    """
+    if registry is None:
+        registry = await PeopleRegistry().load()
+    if checkpoints is None:
+        checkpoints = Checkpoints()
+    await gather(
+        *(
+            insert_shard(
+                name,
+                shard,
+                submission_mapping,
+                revision_mapping,
+                reviewer_columns,
+                registry,
+                checkpoints,
+                incremental,
+            )
+            for shard in shard_chunks(chunks, shards)
+        )
+    )
@@ -0,0 +1,158 @@
+"""
+Schedule the insert modules by their table dependencies.
+
+Every input file is parsed up front in a worker thread.
+A loader starts inserting as soon as its file is parsed and all loaders creating the
+tables it references are done. Independent loaders thus run concurrently, each in its
+own session on a separate pooled connection.
+Loaders finished by an earlier, failed import are skipped when resuming it.
+"""
+from asyncio import Task, create_task, gather, to_thread
+from time import perf_counter
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from cmt_statistics_tool.helper import Checkpoints
+from cmt_statistics_tool.insert.metrics import (
+    LoaderMetrics,
+    set_current_metrics,
+    write_summary,
+)
+from cmt_statistics_tool.tables import async_session
+
+
+class Loader(NamedTuple):
+    name: str
+    parse: Callable[[], Any]
+    insert: Callable[[Any], Awaitable[None]]
+    creates: Tuple[str, ...]
+    references: Tuple[str, ...]
+
+
+class Timing(NamedTuple):
+    parsed: float
+    started: float
+    finished: float
+
+
+def dependencies(loaders: Sequence[Loader]) -> Dict[str, List[str]]:
+    """Get the names of all loaders creating a table referenced by each loader"""
+    return {
+        loader.name: [
+            other.name
+            for other in loaders
+            if other is not loader and set(loader.references) & set(other.creates)
+        ]
+        for loader in loaders
+    }
+
+
+def critical_path(
+    loaders: Sequence[Loader], timings: Dict[str, Timing]
+) -> List[Tuple[str, float]]:
+    """
+    Get the chain of steps that determined the total run time.
+
+    Starting from the last loader to finish, follow whatever it waited for last:
+    either its parse step or the dependency finishing last.
+    """
+    depends_on = dependencies(loaders)
+    name = max(timings, key=lambda name: timings[name].finished)
+    path: List[Tuple[str, float]] = []
+    while True:
+        timing = timings[name]
+        path.append((f"insert {name}", timing.finished - timing.started))
+        blocking = max(
+            depends_on[name], key=lambda name: timings[name].finished, default=None
+        )
+        if blocking is None or timings[blocking].finished < timing.parsed:
+            path.append((f"parse {name}", timing.parsed))
+            return path[::-1]
+        name = blocking
+
+
+async def run_loaders(
+    loaders: Sequence[Loader],
+    checkpoints: Optional[Checkpoints] = None,
+    summary: Optional[str] = None,
+    prepare: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+) -> Dict[str, Timing]:
+    """
+    Run all loaders as early as their dependencies allow and report their metrics.
+
+    Loaders finished according to the checkpoints are skipped, the others are
+    recorded as finished once done. With a summary path, the metrics of all loaders
+    are written there as JSON, see the metrics module.
+    With prepare, all files are parsed first. It is awaited with the parsed data of
+    all loaders by their name, before anything is inserted, e.g. to validate them.
+    """
+    if checkpoints is not None:
+        finished = checkpoints.finished
+        loaders = [loader for loader in loaders if loader.name not in finished]
+        if not loaders:
+            return {}
+    start = perf_counter()
+    depends_on = dependencies(loaders)
+    metrics = {loader.name: LoaderMetrics(loader.name) for loader in loaders}
+    tasks: Dict[str, Task[None]] = {}
+    timings: Dict[str, Timing] = {}
+
+    def parse(loader: Loader) -> Tuple[Any, float]:
+        parse_start = perf_counter()
+        return loader.parse(), perf_counter() - parse_start
+
+    parsing = {loader.name: create_task(to_thread(parse, loader)) for loader in loaders}
+    if prepare is not None:
+        await prepare({name: (await task)[0] for name, task in parsing.items()})
+        print(f"Prepared after {perf_counter() - start:.1f}s")
+
+    async def run(loader: Loader) -> None:
+        loader_metrics = metrics[loader.name]
+        set_current_metrics(loader_metrics)  # only for this loader's task
+        data, loader_metrics.parse_seconds = await parsing[loader.name]
+        parsed = perf_counter() - start
+        await gather(*(tasks[name] for name in depends_on[loader.name]))
+        started = perf_counter() - start
+        await loader.insert(data)
+        if checkpoints is not None:
+            async with async_session() as session:
+                async with session.begin():
+                    await checkpoints.save(
+                        session,
+                        loader.name,
+                        checkpoints.chunks.get(loader.name, 0),
+                        finished=True,
+                    )
+        timings[loader.name] = Timing(parsed, started, perf_counter() - start)
+        loader_metrics.insert_seconds = timings[loader.name].finished - started
+
+    for loader in loaders:
+        tasks[loader.name] = create_task(run(loader))
+    await gather(*tasks.values())
+    total = perf_counter() - start
+
+    for name, timing in timings.items():
+        m = metrics[name]
+        print(
+            f"{name}: parsed in {m.parse_seconds:.1f}s, read {m.rows_read} rows, "
+            f"wrote {m.rows_written} rows from {timing.started:.1f}s "
+            f"to {timing.finished:.1f}s ({m.rows_per_second:.0f} rows/s, "
+            f"DB {m.db_seconds:.1f}s, commit {m.commit_seconds:.1f}s)"
+        )
+    path = critical_path(loaders, timings)
+    print(
+        "Critical path:",
+        " -> ".join(f"{step} ({duration:.1f}s)" for step, duration in path),
+    )
+    if summary is not None:
+        write_summary(summary, list(metrics.values()), total, path)
+    return timings
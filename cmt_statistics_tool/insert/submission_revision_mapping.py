@@ -3,25 +3,56 @@ Insert the submission_revisions_mapping file into the DB.
 
 This is used for manually mapping submission ids and revision ids.
 """
-from pandas import read_excel
-from sqlalchemy import bindparam, update
+from concurrent.futures import Executor
+from typing import Optional, Tuple
 
+from pandas import DataFrame, read_excel
+from sqlalchemy import Integer, column, update, values
+
+from cmt_statistics_tool.cache import cached
+from cmt_statistics_tool.helper import bump_versions
+from cmt_statistics_tool.insert.metrics import current_metrics
 from cmt_statistics_tool.tables import Revision, async_session
 
 
-async def insert_submission_revision_mapping(file: str) -> None:
-    df = read_excel(file)[["Revision ID", "OriginalSubmission ID"]]
+def parse_submission_revision_mapping(
+    file: str, pool: Optional[Executor] = None
+) -> Tuple[DataFrame]:
+    """Parse the mapping file, as a task in the pool if given."""
+    if pool is not None:
+        return pool.submit(parse_submission_revision_mapping, file).result()
+    return (read_excel(file)[["Revision ID", "OriginalSubmission ID"]],)
+
+
+def read_submission_revision_mapping(
+    file: str, pool: Optional[Executor] = None
+) -> DataFrame:
+    """Read the mapping file, see cached."""
+    (df,) = cached(parse_submission_revision_mapping, file, pool)
+    return df
+
+
+async def insert_submission_revision_mapping(df: DataFrame) -> None:
+    """Set the submission ids of all revisions with a single UPDATE ... FROM VALUES"""
+    if df.empty:
+        return
+    mapping = values(
+        column("rid", Integer),
+        column("oid", Integer),
+        name="mapping",
+        # Rendered inline, untyped parameters in VALUES would be text
+        literal_binds=True,
+    ).data(list(df.itertuples(index=False, name=None)))
     statement = (
         update(Revision)
-        .where(Revision.id == bindparam("rid"))
-        .values(submission_id=bindparam("oid"))
+        .where(Revision.id == mapping.c.rid)
+        .values(submission_id=mapping.c.oid)
     )
+    metrics = current_metrics()
+    metrics.rows_read += len(df)
     async with async_session() as session:
-        async with session.begin():
-            await session.execute(
-                statement,
-                [
-                    {"rid": row["Revision ID"], "oid": row["OriginalSubmission ID"]}
-                    for _, row in df.iterrows()
-                ],
-            )
+        async with metrics.transaction(session):
+            async with metrics.db():
+                await session.execute(statement)
+            await bump_versions(session, Revision.__tablename__)
+    metrics.rows_written += len(df)
@@ -0,0 +1,158 @@
+"""
+Validate parsed exports against the table constraints, before writing anything.
+
+All NOT NULL columns, primary keys and foreign keys of the tables are checked against
+the parsed frames in memory, using the mappings of the insert modules. This reports
+all problems of an import at once, instead of failing on the first one midway through
+writing it.
+Foreign keys to people are not checked, as people are created from the names and
+emails in the exports.
+"""
+from typing import Any, Dict, Iterable, List, NamedTuple, Sequence, Set, Tuple
+
+from pandas import DataFrame, Series, concat
+
+from cmt_statistics_tool.helper import person_key
+from cmt_statistics_tool.insert.mapping import Mapping
+
+
+class Source(NamedTuple):
+    mapping: Mapping
+    df: DataFrame
+    # The name and email columns of the people whose ids are assigned on insert
+    people: Dict[str, Tuple[str, str]]
+
+
+class Reference(NamedTuple):
+    name: str
+    values: Series
+    # The referenced column as "table.column"
+    target: str
+
+
+class ValidationError(ValueError):
+    """All errors found by validate"""
+
+    def __init__(self, errors: List[str]) -> None:
+        super().__init__("\n".join(errors))
+        self.errors = errors
+
+
+def chunk_sources(
+    chunks: Iterable[Tuple[bool, DataFrame]],
+    submission_mapping: Mapping,
+    revision_mapping: Mapping,
+    people: Dict[str, Tuple[str, str]],
+) -> List[Source]:
+    """Combine chunks (see chunk_original_revision) into a source per table"""
+    frames: Dict[bool, List[DataFrame]] = {False: [], True: []}
+    for is_revision, df in chunks:
+        frames[is_revision].append(df)
+    return [
+        Source(mapping, concat(frames[is_revision], ignore_index=True), people)
+        for is_revision, mapping in (
+            (False, submission_mapping),
+            (True, revision_mapping),
+        )
+        if frames[is_revision]
+    ]
+
+
+def examples(values: Series, count: int = 5) -> str:
+    """Show the first distinct values of a series"""
+    shown = ", ".join(str(value) for value in values.drop_duplicates()[:count])
+    return shown + (", ..." if values.nunique() > count else "")
+
+
+def label(source: Source, column: str) -> str:
+    """Name a mapped column by the export columns it is read from"""
+    return "/".join(source.people.get(column, (column,)))
+
+
+def table_columns(source: Source) -> Dict[str, Series]:
+    """Get the values of all table columns that can be read from a source"""
+    columns = {}
+    for column, target in source.mapping.columns.items():
+        if column in source.people:
+            names, emails = source.people[column]
+            if names in source.df and emails in source.df:
+                columns[target] = Series(
+                    [
+                        person_key(name, email)
+                        if isinstance(name, str) and isinstance(email, str)
+                        else None
+                        for name, email in zip(source.df[names], source.df[emails])
+                    ],
+                    index=source.df.index,
+                    dtype=object,
+                )
+        elif column in source.df:
+            columns[target] = source.df[column]
+    return columns
+
+
+def validate(
+    sources: Sequence[Source], references: Sequence[Reference] = ()
+) -> List[str]:
+    """
+    Check all sources against the constraints of their tables.
+
+    Checks that mapped NOT NULL columns without a fill rule have values, that primary
+    keys are unique, and that foreign keys reference rows of the other sources.
+    references are checked like foreign keys. Returns all errors found.
+    """
+    columns = [table_columns(source) for source in sources]
+    keys: Dict[str, Set[Any]] = {}
+    for source, values in zip(sources, columns):
+        for name, series in values.items():
+            key = f"{source.mapping.table.__tablename__}.{name}"
+            keys.setdefault(key, set()).update(series.dropna())
+
+    errors: List[str] = []
+    checks = list(references)
+    for source, values in zip(sources, columns):
+        table = source.mapping.table.__table__
+        paper_ids = source.df.get("Paper ID", Series("?", index=source.df.index))
+        for column, target in source.mapping.columns.items():
+            if target not in values:
+                errors.append(f"{table.name}: column {label(source, column)} missing")
+            elif not table.c[target].nullable and column not in source.mapping.fillna:
+                missing = values[target].isna()
+                if missing.any():
+                    errors.append(
+                        f"{table.name}: {missing.sum()} rows without "
+                        f"{label(source, column)}, "
+                        f"e.g. Paper ID {examples(paper_ids[missing])}"
+                    )
+        primary_key = [column.name for column in table.primary_key]
+        if all(name in values for name in primary_key):
+            duplicated = DataFrame(
+                {name: values[name] for name in primary_key}
+            ).duplicated(keep=False)
+            if duplicated.any():
+                errors.append(
+                    f"{table.name}: {duplicated.sum()} rows with a duplicate "
+                    f"{', '.join(primary_key)}, "
+                    f"e.g. Paper ID {examples(paper_ids[duplicated])}"
+                )
+        for key_column in table.columns:
+            for foreign_key in key_column.foreign_keys:
+                referenced = foreign_key.column.table.name
+                if referenced != "people" and key_column.name in values:
+                    checks.append(
+                        Reference(
+                            f"{table.name}.{key_column.name}",
+                            values[key_column.name],
+                            f"{referenced}.{foreign_key.column.name}",
+                        )
+                    )
+
+    for check in checks:
+        referencing = check.values.dropna()
+        dangling = referencing[~referencing.isin(keys.get(check.target, set()))]
+        if not dangling.empty:
+            errors.append(
+                f"{check.name}: {len(dangling)} rows reference a missing "
+                f"{check.target}, e.g. {examples(dangling)}"
+            )
+    return errors
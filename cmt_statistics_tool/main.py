@@ -2,53 +2,436 @@
 Main entrypoint to create the database.
 
 Running this will delete all tables, create them, and insert all data.
+With --incremental, the tables are kept and only the changes since the last import
+are written: new and changed rows are upserted, rows missing from the export deleted.
+With --bulk, the tables are created without constraints, which are only added after
+all data is inserted. This is faster, but duplicates are detected only at the end.
+With --resume, a failed import is continued at the first stage or chunk it did not
+commit, keeping the tables. It needs the same --shards and --bulk as the failed one.
+Before anything is written, the exports are validated against the table constraints,
+with --check only that.
+With --shards, the papers, reviews and metareviews are split by paper id ranges, which
+are loaded concurrently over separate connections.
+Finally, people rows of the same researcher are resolved into identities, and the
+materialized views the statistics read are refreshed.
 If your DB lives elsewhere, please change the connection string in the tables module.
 If your files are named differently, please change them here.
 """
 
-from asyncio import run
+from argparse import ArgumentParser
+from asyncio import gather, run, to_thread
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from typing import Any, Dict, List
 
-from sqlalchemy.schema import CreateTable
+from sqlalchemy import ForeignKeyConstraint, Table, text
+from sqlalchemy.engine import Connection, Dialect
+from sqlalchemy.schema import AddConstraint, CreateColumn, CreateIndex, CreateTable
+from sqlalchemy.types import SchemaType
 from uvloop import install
 
 import cmt_statistics_tool.tables as tables
+from cmt_statistics_tool.helper import (
+    Checkpoints,
+    PeopleRegistry,
+    ResumeError,
+    bump_versions,
+    chunk_original_revision,
+)
+from cmt_statistics_tool.insert import metareviews, reviews
+from cmt_statistics_tool.insert.identities import insert_identities
 from cmt_statistics_tool.insert.metareviews import insert_metareviews
-from cmt_statistics_tool.insert.papers import insert_papers
-from cmt_statistics_tool.insert.people import insert_people
+from cmt_statistics_tool.insert.metrics import add_peak_memory
+from cmt_statistics_tool.insert.papers import insert_papers, paper_mappings
+from cmt_statistics_tool.insert.people import insert_people, read_people
 from cmt_statistics_tool.insert.reviews import insert_reviews
+from cmt_statistics_tool.insert.scheduler import Loader, run_loaders
 from cmt_statistics_tool.insert.submission_revision_mapping import (
     insert_submission_revision_mapping,
+    read_submission_revision_mapping,
+)
+from cmt_statistics_tool.insert.validation import (
+    Reference,
+    ValidationError,
+    chunk_sources,
+    validate,
+)
+from cmt_statistics_tool.tables.version import (
+    read_tables,
+    table_version,
+    table_versions,
+    version_metadata,
 )
+from cmt_statistics_tool.tables.views import view_metadata
 
+# Rows per chunk of the chunked exports, see chunk_original_revision
+CHUNK_SIZES = {"papers": 500, "reviews": 10000, "metareviews": 10000}
 
-async def create_tables() -> None:
+
+def create_bare_tables(connection: Connection) -> None:
+    """Create all tables and their types, but no constraints or indexes"""
+    for t in tables.Base.metadata.sorted_tables:
+        for column in t.columns:
+            if isinstance(column.type, SchemaType):  # e.g. enums
+                column.type.create(connection, checkfirst=True)
+        columns = ", ".join(str(CreateColumn(c).compile(connection)) for c in t.columns)
+        connection.execute(text(f"CREATE TABLE {t.name} ({columns})"))
+
+
+def add_constraints(connection: Connection) -> None:
+    """Add the constraints and indexes left out by create_bare_tables"""
+    sorted_tables = tables.Base.metadata.sorted_tables
+    for t in sorted_tables:  # referenced keys first
+        for constraint in t.constraints:
+            if not isinstance(constraint, ForeignKeyConstraint):
+                connection.execute(AddConstraint(constraint))
+    for t in sorted_tables:
+        for constraint in t.foreign_key_constraints:
+            connection.execute(AddConstraint(constraint))
+        for index in t.indexes:
+            connection.execute(CreateIndex(index))
+
+
+def view_statements(view: Table, dialect: Dialect) -> List[str]:
+    """Get the statements creating a view and the unique index to refresh it by"""
+    query = view.info["query"].compile(
+        dialect=dialect, compile_kwargs={"literal_binds": True}
+    )
+    return [
+        f"CREATE MATERIALIZED VIEW {view.name} AS\n{query}",
+        f"CREATE UNIQUE INDEX {view.name}_key ON {view.name} "
+        f"({', '.join(view.info['unique'])})",
+    ]
+
+
+async def create_tables(drop: bool = True, bare: bool = False) -> None:
     for t in tables.Base.metadata.sorted_tables:
         with open(f"cmt_statistics_tool/sql/CREATE_{t}.sql", "w") as f:
             statement = str(CreateTable(t).compile(tables.engine)).strip()
             print(statement, file=f)
+    for view in view_metadata.sorted_tables:
+        with open(f"cmt_statistics_tool/sql/CREATE_{view}.sql", "w") as f:
+            print(";\n".join(view_statements(view, tables.engine.dialect)), file=f)
+    with open(f"cmt_statistics_tool/sql/CREATE_{table_version}.sql", "w") as f:
+        print(str(CreateTable(table_version).compile(tables.engine)).strip(), file=f)
+    async with tables.engine.connect() as connection:
+        if drop:
+            # The views depend on the tables
+            views = ", ".join(view.name for view in view_metadata.sorted_tables)
+            await connection.exec_driver_sql(
+                f"DROP MATERIALIZED VIEW IF EXISTS {views}"
+            )
+            await connection.run_sync(tables.Base.metadata.drop_all)
+        if bare:
+            await connection.run_sync(create_bare_tables)
+        else:
+            await connection.run_sync(tables.Base.metadata.create_all)
+        # Kept when dropping the tables, see the version module
+        await connection.run_sync(version_metadata.create_all)
+        if drop:
+            # Cached results of the dropped tables and views are outdated
+            await bump_versions(
+                connection,
+                *(t.name for t in tables.Base.metadata.sorted_tables),
+                *(view.name for view in view_metadata.sorted_tables),
+            )
+        await connection.commit()
+
+
+async def finish_tables(constraints: bool = False) -> None:
+    """Optionally add the constraints, then update the planner statistics"""
     async with tables.engine.connect() as connection:
-        await connection.run_sync(tables.Base.metadata.drop_all)
-        await connection.run_sync(tables.Base.metadata.create_all)
+        if constraints:
+            await connection.run_sync(add_constraints)
+        for t in tables.Base.metadata.sorted_tables:
+            await connection.execute(text(f"ANALYZE {t.name}"))
         await connection.commit()
 
 
-async def insert_data() -> None:
-    await insert_people("data/people.txt")
-    await insert_papers("data/papers.xlsx")
-    await insert_reviews("data/reviews.xlsx")
-    await insert_metareviews("data/metareviews.xlsx")
-    await insert_submission_revision_mapping("data/mapping.xlsx")
+async def refresh_views() -> None:
+    """
+    Create the missing views and refresh the others concurrently, see views.
+
+    Views whose tables did not change since their last refresh are kept as they are.
+    """
+    async with tables.engine.connect() as connection:
+        result = await connection.execute(
+            text(
+                "SELECT matviewname FROM pg_matviews "
+                "WHERE schemaname = current_schema()"
+            )
+        )
+        existing = set(result.scalars())
+        changed = []
+        for view in view_metadata.sorted_tables:
+            versions = await table_versions(connection, read_tables(view))
+            if view.name not in existing:
+                for statement in view_statements(view, connection.dialect):
+                    await connection.exec_driver_sql(statement)
+            elif max(versions.values()) > versions[view.name]:
+                await connection.exec_driver_sql(
+                    f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view.name}"
+                )
+            else:
+                continue
+            changed.append(view.name)
+        if changed:
+            await bump_versions(connection, *changed)
+        await connection.commit()
+
+
+def get_loaders(
+    registry: PeopleRegistry,
+    pool: Executor,
+    checkpoints: Checkpoints,
+    incremental: bool = False,
+    directory: str = "data",
+    shards: int = 1,
+) -> List[Loader]:
+    """Get the loaders of all exports in a directory, see the scheduler module"""
+    return [
+        Loader(
+            "people",
+            lambda: read_people(f"{directory}/people.txt", pool),
+            lambda df: insert_people(df, registry),
+            creates=("people",),
+            references=(),
+        ),
+        Loader(
+            "papers",
+            lambda: list(
+                chunk_original_revision(
+                    f"{directory}/papers.xlsx", CHUNK_SIZES["papers"], pool
+                )
+            ),
+            lambda chunks: insert_papers(
+                chunks,
+                registry,
+                incremental=incremental,
+                checkpoints=checkpoints,
+                shards=shards,
+            ),
+            creates=(
+                "submission",
+                "revision",
+                "submission_people",
+                "revision_people",
+            ),
+            references=("people",),
+        ),
+        Loader(
+            "reviews",
+            lambda: list(
+                chunk_original_revision(
+                    f"{directory}/reviews.xlsx", CHUNK_SIZES["reviews"], pool
+                )
+            ),
+            lambda chunks: insert_reviews(
+                chunks,
+                registry,
+                incremental=incremental,
+                checkpoints=checkpoints,
+                shards=shards,
+            ),
+            creates=("submission_review", "revision_review"),
+            references=("people", "submission", "revision"),
+        ),
+        Loader(
+            "metareviews",
+            lambda: list(
+                chunk_original_revision(
+                    f"{directory}/metareviews.xlsx", CHUNK_SIZES["metareviews"], pool
+                )
+            ),
+            lambda chunks: insert_metareviews(
+                chunks,
+                registry,
+                incremental=incremental,
+                checkpoints=checkpoints,
+                shards=shards,
+            ),
+            creates=("submission_metareview", "revision_metareview"),
+            references=("people", "submission", "revision"),
+        ),
+        Loader(
+            "mapping",
+            lambda: read_submission_revision_mapping(f"{directory}/mapping.xlsx", pool),
+            insert_submission_revision_mapping,
+            creates=(),
+            references=("submission", "revision"),
+        ),
+        Loader(
+            "identities",
+            lambda: None,
+            lambda _: insert_identities(),
+            creates=("people_identity",),
+            # All loaders registering people have to be done
+            references=(
+                "people",
+                "submission_people",
+                "submission_review",
+                "submission_metareview",
+            ),
+        ),
+    ]
+
+
+def validate_exports(parsed: Dict[str, Any]) -> None:
+    """Validate the parsed exports of all loaders, see the validation module"""
+    mapping = parsed["mapping"]
+    errors = validate(
+        [
+            *chunk_sources(
+                parsed["papers"],
+                paper_mappings[tables.Submission],
+                paper_mappings[tables.Revision],
+                {
+                    "Primary Author ID": (
+                        "Primary Contact Author Name",
+                        "Primary Contact Author Email",
+                    )
+                },
+            ),
+            *chunk_sources(
+                parsed["reviews"],
+                reviews.submission_mapping,
+                reviews.revision_mapping,
+                {"Reviewer ID": ("Reviewer Name", "Reviewer Email")},
+            ),
+            *chunk_sources(
+                parsed["metareviews"],
+                metareviews.submission_mapping,
+                metareviews.revision_mapping,
+                {"Reviewer ID": ("Meta-Reviewer Name", "Meta-Reviewer Email")},
+            ),
+        ],
+        [
+            Reference("mapping Revision ID", mapping["Revision ID"], "revision.id"),
+            Reference(
+                "mapping OriginalSubmission ID",
+                mapping["OriginalSubmission ID"],
+                "submission.id",
+            ),
+        ],
+    )
+    if errors:
+        raise ValidationError(errors)
+
+
+async def check_data() -> None:
+    """Parse and validate all exports, without connecting to the DB"""
+    with ProcessPoolExecutor(mp_context=get_context("spawn")) as pool:
+        loaders = get_loaders(PeopleRegistry(), pool, Checkpoints())
+        parsed = await gather(*(to_thread(loader.parse) for loader in loaders))
+    await to_thread(
+        validate_exports,
+        {loader.name: data for loader, data in zip(loaders, parsed)},
+    )
+
+
+async def insert_data(
+    incremental: bool = False,
+    resume: bool = False,
+    shards: int = 1,
+    bulk: bool = False,
+) -> None:
+    """
+    Insert all exports, see the scheduler module.
+
+    The exports are validated before the tables are touched, except when resuming.
+    """
+    registry = PeopleRegistry()
+    # Resuming without the bulk mode would leave the tables without constraints
+    checkpoints = Checkpoints({"bulk": int(bulk), "shards": shards, **CHUNK_SIZES})
+    if resume:
+        await registry.load()
+        await checkpoints.load()
+
+    async def prepare(parsed: Dict[str, Any]) -> None:
+        await to_thread(validate_exports, parsed)
+        if incremental:
+            print("Creating missing tables...", end=" ")
+        else:
+            print("Dropping & Creating tables...", end=" ")
+        await create_tables(drop=not incremental, bare=bulk)
+        print("done! ✅")
+        await registry.load()
+        await checkpoints.clear()
+
+    summary = f"data/metrics/import_{datetime.now():%Y-%m-%d_%H-%M-%S}.json"
+    # Spawn the parsing processes, forking the running event loop's threads is unsafe
+    with ProcessPoolExecutor(mp_context=get_context("spawn")) as pool:
+        timings = await run_loaders(
+            get_loaders(registry, pool, checkpoints, incremental, shards=shards),
+            checkpoints,
+            summary=summary,
+            prepare=None if resume else prepare,
+        )
+    # Without timings, all loaders had finished before and no summary was written
+    if timings:
+        add_peak_memory(summary)
 
 
 def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--incremental",
+        action="store_true",
+        help="keep the tables and only write the changes since the last import",
+    )
+    mode.add_argument(
+        "--bulk",
+        action="store_true",
+        help="add constraints and indexes only after inserting all data",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue a failed import where it stopped, keeping the tables",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=4,
+        help="number of paper id ranges each large export is loaded in concurrently,"
+        " each over its own connection (resume with the same number)",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="only validate the exports, without connecting to the DB",
+    )
+    args = parser.parse_args()
+    if args.resume and args.incremental:
+        parser.error("argument --resume: not allowed with argument --incremental")
+
     install()
-    print("Dropping & Creating tables...", end=" ")
-    run(create_tables())
-    print("done! ✅")
+    try:
+        if args.check:
+            print("Validating data...", end=" ")
+            run(check_data())
+            print("done! ✅")
+            return
+        print("Inserting data...")
+        run(insert_data(args.incremental, args.resume, args.shards, args.bulk))
+        print("Inserting data... done! ✅")
+    except ValidationError as e:
+        parser.exit(1, f"\nThe exports are invalid, nothing was written:\n{e}\n")
+    except ResumeError as e:
+        parser.exit(1, f"\nThe import cannot be resumed: {e}\n")
 
-    print("Inserting data...")
-    run(insert_data())
-    print("Inserting data... done! ✅")
+    if args.bulk:
+        print("Adding constraints & analyzing tables...", end=" ")
+    else:
+        print("Analyzing tables...", end=" ")
+    run(finish_tables(constraints=args.bulk))
+    print("done! ✅")
+    # The views need the primary keys, which bulk imports only add now
+    print("Refreshing views...", end=" ")
+    run(refresh_views())
+    print("done! ✅")
 
 
 if __name__ == "__main__":
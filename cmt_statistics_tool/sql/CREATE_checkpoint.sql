@@ -0,0 +1,7 @@
+CREATE TABLE checkpoint (
+	stage VARCHAR(100) NOT NULL, 
+	chunks INTEGER NOT NULL, 
+	finished BOOLEAN NOT NULL, 
+	parameters VARCHAR(200) NOT NULL, 
+	PRIMARY KEY (stage)
+)
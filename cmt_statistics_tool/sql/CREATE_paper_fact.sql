@@ -0,0 +1,11 @@
+CREATE MATERIALIZED VIEW paper_fact AS
+SELECT submission.id AS submission_id, anon_1.revision_id, coalesce(revision_1.status, submission.status) AS status, submission.status = 'Accept' OR coalesce(revision_1.status, submission.status) = 'Accept' AS ultimately_accepted, submission.category, submission.track_name, submission.primary_subject_area, (SELECT count(*) AS count_1 
+FROM submission_people 
+WHERE submission_people.submission_id = submission.id AND submission_people.relation_type = 'AUTHOR') AS n_authors, coalesce(people_1.country, (SELECT people.country 
+FROM submission_people JOIN people ON people.id = submission_people.people_id 
+WHERE submission_people.submission_id = submission.id AND submission_people.relation_type = 'AUTHOR' AND people.country IS NOT NULL ORDER BY people.id 
+ LIMIT 1)) AS country, lower(split_part(people_1.email, '@', 2)) AS email_domain 
+FROM submission JOIN people AS people_1 ON people_1.id = submission.primary_author_id LEFT OUTER JOIN (SELECT revision.submission_id AS submission_id, max(revision.id) AS revision_id 
+FROM revision 
+WHERE revision.submission_id IS NOT NULL GROUP BY revision.submission_id) AS anon_1 ON anon_1.submission_id = submission.id LEFT OUTER JOIN revision AS revision_1 ON revision_1.id = anon_1.revision_id;
+CREATE UNIQUE INDEX paper_fact_key ON paper_fact (submission_id)
@@ -0,0 +1,7 @@
+CREATE TABLE people_identity (
+	people_id INTEGER NOT NULL, 
+	identity_id INTEGER NOT NULL, 
+	PRIMARY KEY (people_id), 
+	FOREIGN KEY(people_id) REFERENCES people (id), 
+	FOREIGN KEY(identity_id) REFERENCES people (id)
+)
@@ -0,0 +1,6 @@
+CREATE MATERIALIZED VIEW revision_author_counts AS
+SELECT anon_1.n_authors, anon_1.status, count(*) AS count 
+FROM (SELECT revision.status AS status, count(*) AS n_authors 
+FROM revision JOIN revision_people ON revision.id = revision_people.revision_id 
+WHERE revision_people.relation_type = 'AUTHOR' GROUP BY revision.id, revision.status) AS anon_1 GROUP BY anon_1.n_authors, anon_1.status;
+CREATE UNIQUE INDEX revision_author_counts_key ON revision_author_counts (n_authors, status)
@@ -0,0 +1,8 @@
+CREATE MATERIALIZED VIEW revision_country_counts AS
+SELECT anon_1.primary_country, anon_1.country, anon_1.status, count(*) AS count 
+FROM (SELECT people_1.country AS primary_country, coalesce(people_1.country, (SELECT people.country 
+FROM revision_people JOIN people ON people.id = revision_people.people_id 
+WHERE revision_people.revision_id = revision.id AND revision_people.relation_type = 'AUTHOR' AND people.country IS NOT NULL ORDER BY people.id 
+ LIMIT 1)) AS country, revision.status AS status 
+FROM revision JOIN people AS people_1 ON people_1.id = revision.primary_author_id) AS anon_1 GROUP BY anon_1.primary_country, anon_1.country, anon_1.status;
+CREATE UNIQUE INDEX revision_country_counts_key ON revision_country_counts (primary_country, country, status)
@@ -0,0 +1,4 @@
+CREATE MATERIALIZED VIEW revision_status_counts AS
+SELECT revision.track_name, revision.category, revision.status, count(*) AS count 
+FROM revision GROUP BY revision.track_name, revision.category, revision.status;
+CREATE UNIQUE INDEX revision_status_counts_key ON revision_status_counts (track_name, category, status)
@@ -0,0 +1,7 @@
+CREATE TABLE row_hash (
+	table_name VARCHAR(100) NOT NULL, 
+	paper_id INTEGER NOT NULL, 
+	people_id INTEGER NOT NULL, 
+	hash BIGINT NOT NULL, 
+	PRIMARY KEY (table_name, paper_id, people_id)
+)
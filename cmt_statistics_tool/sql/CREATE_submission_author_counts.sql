@@ -0,0 +1,6 @@
+CREATE MATERIALIZED VIEW submission_author_counts AS
+SELECT anon_1.n_authors, anon_1.status, count(*) AS count 
+FROM (SELECT submission.status AS status, count(*) AS n_authors 
+FROM submission JOIN submission_people ON submission.id = submission_people.submission_id 
+WHERE submission_people.relation_type = 'AUTHOR' GROUP BY submission.id, submission.status) AS anon_1 GROUP BY anon_1.n_authors, anon_1.status;
+CREATE UNIQUE INDEX submission_author_counts_key ON submission_author_counts (n_authors, status)
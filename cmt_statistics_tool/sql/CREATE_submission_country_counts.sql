@@ -0,0 +1,8 @@
+CREATE MATERIALIZED VIEW submission_country_counts AS
+SELECT anon_1.primary_country, anon_1.country, anon_1.status, count(*) AS count 
+FROM (SELECT people_1.country AS primary_country, coalesce(people_1.country, (SELECT people.country 
+FROM submission_people JOIN people ON people.id = submission_people.people_id 
+WHERE submission_people.submission_id = submission.id AND submission_people.relation_type = 'AUTHOR' AND people.country IS NOT NULL ORDER BY people.id 
+ LIMIT 1)) AS country, submission.status AS status 
+FROM submission JOIN people AS people_1 ON people_1.id = submission.primary_author_id) AS anon_1 GROUP BY anon_1.primary_country, anon_1.country, anon_1.status;
+CREATE UNIQUE INDEX submission_country_counts_key ON submission_country_counts (primary_country, country, status)
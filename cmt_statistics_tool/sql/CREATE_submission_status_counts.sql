@@ -0,0 +1,4 @@
+CREATE MATERIALIZED VIEW submission_status_counts AS
+SELECT submission.track_name, submission.category, submission.status, count(*) AS count 
+FROM submission GROUP BY submission.track_name, submission.category, submission.status;
+CREATE UNIQUE INDEX submission_status_counts_key ON submission_status_counts (track_name, category, status)
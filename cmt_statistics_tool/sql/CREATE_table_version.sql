@@ -0,0 +1,5 @@
+CREATE TABLE table_version (
+	id SERIAL NOT NULL, 
+	table_name VARCHAR(100) NOT NULL, 
+	PRIMARY KEY (id)
+)
@@ -9,26 +9,62 @@ Redundant/alternative plots:
 - 02_03_submission and 02_03_revision in favour of 02_03_both
 - 02_04_revision and 02_04_submission in favour of 02_04_both
 - 03_02_submission and 03_02_revision in favour of 03_02_both
+
+Query results are cached on disk until an import changes the tables they read, see
+the cache module.
+Figures are plotted on explicit Figure objects instead of pyplot's global state, so
+jobs of a frame, a plot function and an output path can be rendered in parallel by a
+render_pool, see render_all.
 """
 
+from asyncio import Semaphore
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import Callable, Iterable, Union
+from multiprocessing import get_context
+from typing import Any, Callable, NamedTuple, Optional, Sequence, Union
 
-from matplotlib import pyplot as plt
+from matplotlib import use
 from matplotlib.axes import Axes
 from matplotlib.figure import Figure
 from pandas import DataFrame
 from seaborn import despine, set_theme
-from sqlalchemy.engine.row import Row
 from sqlalchemy.sql.selectable import CompoundSelect, Select
 
+from cmt_statistics_tool.statistics.cache import ResultCache
 from cmt_statistics_tool.tables import async_session
 
+# Limits the queries running at once, see limit_queries
+query_slots: Optional[Semaphore] = None
+# Set to None to always query the DB
+result_cache: Optional[ResultCache] = ResultCache()
 
-async def get_data(statement: Union[Select, CompoundSelect]) -> Iterable[Row]:
-    """Get data from an SQLAlchemy statement in a session"""
+
+def limit_queries(concurrency: int) -> None:
+    """Set how many queries of all statistics may run at once, in the running loop"""
+    global query_slots
+    query_slots = Semaphore(concurrency)
+
+
+async def fetch(statement: Union[Select, CompoundSelect]) -> Sequence[Sequence[Any]]:
     async with async_session() as session:
-        return (await session.execute(statement)).fetchall()
+        if result_cache is None:
+            return (await session.execute(statement)).fetchall()
+        # Read the versions first, so a concurrent import never leaves a stale result
+        key = await result_cache.key(session, statement)
+        if (cached := result_cache.load(key)) is not None:
+            return cached
+        result = await session.execute(statement)
+        rows = result.fetchall()
+        result_cache.store(key, list(result.keys()), rows)
+        return rows
+
+
+async def get_data(statement: Union[Select, CompoundSelect]) -> Sequence[Sequence[Any]]:
+    """Get data from an SQLAlchemy statement in a session"""
+    if query_slots is None:
+        return await fetch(statement)
+    async with query_slots:
+        return await fetch(statement)
 
 
 def format_sort_track(
@@ -41,11 +77,39 @@ def format_sort_track(
     return df.sort_values(track_column)
 
 
+class PlotJob(NamedTuple):
+    df: DataFrame
+    # A module-level function, so it can be sent to other processes
+    plot: Callable[[DataFrame, Axes], None]
+    path: str
+
+
 def plot_df(df: DataFrame, plot_fn: Callable[[DataFrame, Axes], None]) -> Figure:
     """Plot a figure with common properties"""
     set_theme(context="talk", style="ticks", palette="colorblind")
-    fig, ax = plt.subplots(figsize=(13, 7), dpi=100)
+    fig = Figure(figsize=(13, 7), dpi=100)
+    ax = fig.subplots()
     plot_fn(df, ax)
     despine(ax=ax)
-    plt.tight_layout()
+    fig.tight_layout()
     return fig
+
+
+def render(job: PlotJob) -> str:
+    """Plot a job's frame and save the figure to its path"""
+    plot_df(job.df, job.plot).savefig(job.path)
+    return job.path
+
+
+def render_pool(processes: Optional[int] = None) -> ProcessPoolExecutor:
+    """Get a pool of processes rendering with the Agg backend, one per CPU by default"""
+    # Spawned, forking a process running an event loop's threads is unsafe
+    return ProcessPoolExecutor(
+        processes, mp_context=get_context("spawn"), initializer=use, initargs=("Agg",)
+    )
+
+
+def render_all(jobs: Sequence[PlotJob], processes: Optional[int] = None) -> None:
+    """Render all jobs in parallel, see render_pool"""
+    with render_pool(processes) as pool:
+        list(pool.map(render, jobs))
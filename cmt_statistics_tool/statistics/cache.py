@@ -0,0 +1,105 @@
+"""
+Cache the results of the statistics' queries as Parquet.
+
+A statement is keyed by its compiled SQL and parameters, the database, and the
+versions of all tables it reads, including the views and the tables behind them, see
+the version module. Re-running the statistics after an import thus only re-queries
+the statements reading a table the import changed.
+Results are stored in .cache/queries, and the least recently used ones are deleted
+once all of them take more than max_bytes. Integer columns with NULLs are stored as
+nullable integers and all NULLs are loaded as None, so a cached result equals the
+queried one.
+"""
+from collections import namedtuple
+from hashlib import sha256
+from os import utime
+from pathlib import Path
+from typing import Any, List, Optional, Sequence, Tuple, Union
+
+from pandas import DataFrame, Series, read_parquet
+from pandas.api.types import infer_dtype
+from pyarrow import ArrowInvalid, ArrowTypeError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.selectable import CompoundSelect, Select
+
+from cmt_statistics_tool.tables import engine
+from cmt_statistics_tool.tables.version import read_tables, table_versions
+
+MAX_BYTES = 256 << 20
+
+
+class ResultCache:
+    """Query results on disk, see the module docstring"""
+
+    def __init__(
+        self, directory: Path = Path(".cache/queries"), max_bytes: int = MAX_BYTES
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    async def key(
+        self, session: AsyncSession, statement: Union[Select, CompoundSelect]
+    ) -> str:
+        """Key a statement by what it queries and the versions of what it reads"""
+        compiled = statement.compile(dialect=engine.dialect)
+        versions = await table_versions(session, read_tables(statement))
+        digest = sha256()
+        for part in (
+            engine.url.render_as_string(hide_password=True),
+            compiled,
+            sorted(compiled.params.items()),
+            sorted(versions.items()),
+        ):
+            digest.update(f"{part}\0".encode())
+        return digest.hexdigest()
+
+    def load(self, key: str) -> Optional[List[Tuple[Any, ...]]]:
+        """Get the rows of a cached result as named tuples, like the queried rows"""
+        path = self.directory / f"{key}.parquet"
+        try:
+            df = read_parquet(path)
+        except FileNotFoundError:
+            return None
+        utime(path)  # recently used
+        df = df.astype(object).where(df.notna(), None)
+        Result = namedtuple("Result", list(df.columns), rename=True)  # type: ignore
+        return [Result(*row) for row in df.itertuples(index=False, name=None)]
+
+    def store(
+        self, key: str, columns: Sequence[str], rows: Sequence[Sequence[Any]]
+    ) -> None:
+        """
+        Cache the rows of a result, then evict the least recently used results.
+
+        Results that cannot be stored as Parquet, e.g. because of duplicate column
+        names, are not cached.
+        """
+        if len(set(columns)) < len(columns):
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{key}.parquet"
+        df = DataFrame.from_records(rows, columns=list(columns))
+        for position, column in enumerate(columns):
+            values = [row[position] for row in rows]
+            if infer_dtype(values, skipna=True) == "integer":
+                # Instead of floats, if there are NULLs
+                df[column] = Series(values, dtype="Int64")
+        # Write to a staging file first, so an interrupted write is never loaded
+        staging = path.with_suffix(".partial")
+        try:
+            df.to_parquet(staging)
+        except (ArrowInvalid, ArrowTypeError, ValueError):
+            staging.unlink(missing_ok=True)
+            return
+        staging.rename(path)
+        self.evict()
+
+    def evict(self) -> None:
+        """Delete the least recently used results beyond max_bytes"""
+        files = [(file, file.stat()) for file in self.directory.glob("*.parquet")]
+        files.sort(key=lambda file: file[1].st_mtime, reverse=True)
+        size = 0
+        for file, stat in files:
+            size += stat.st_size
+            if size > self.max_bytes:
+                file.unlink(missing_ok=True)
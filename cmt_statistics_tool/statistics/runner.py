@@ -0,0 +1,165 @@
+"""
+Run all statistics in one process and event loop.
+
+Every statistic module (s01_01 to s03_04) is discovered with its main() and plot
+functions. The frames returned by main() belong to the module's plot functions in the
+order plot_submission, plot_revision, plot_both, or to its plot function alone.
+The queries of all modules run concurrently on the shared connection pool, at most
+--concurrency at once, and each module is rendered as soon as its frames arrive, in
+a pool of --processes processes (see render_pool) while the other queries go on.
+Every frame is written as CSV next to its plot, named like the module's own script
+does, e.g. plots/01_02_submission.png and plots/01_02_submission.csv.
+
+Usage: python -m cmt_statistics_tool.statistics.runner --only 01 s02_03 03_02_both
+"""
+from argparse import ArgumentParser
+from asyncio import as_completed, create_task, gather, get_running_loop, run
+from concurrent.futures import Executor
+from importlib import import_module
+from pathlib import Path
+from pkgutil import iter_modules
+from re import fullmatch
+from types import ModuleType
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+from matplotlib.axes import Axes
+from pandas import DataFrame
+from uvloop import install
+
+import cmt_statistics_tool.statistics as statistics
+from cmt_statistics_tool.statistics import (
+    PlotJob,
+    limit_queries,
+    render,
+    render_pool,
+)
+
+KINDS = ("submission", "revision", "both")
+
+
+class Statistic(NamedTuple):
+    # The name of its files, e.g. 01_02_submission
+    name: str
+    plot: Callable[[DataFrame, Axes], None]
+
+
+class StatisticModule(NamedTuple):
+    module: ModuleType
+    # In the order of the frames returned by main()
+    statistics: List[Statistic]
+
+
+def discover() -> List[StatisticModule]:
+    """Import all statistic modules and pair their frames with plot functions"""
+    modules = []
+    for info in sorted(
+        iter_modules(getattr(statistics, "__path__")), key=lambda info: info.name
+    ):
+        if not fullmatch(r"s\d\d_\d\d", info.name):
+            continue
+        module = import_module(f"{statistics.__name__}.{info.name}")
+        prefix = info.name[1:]
+        if hasattr(module, "plot"):
+            plots = [Statistic(prefix, getattr(module, "plot"))]
+        else:
+            plots = [
+                Statistic(f"{prefix}_{kind}", getattr(module, f"plot_{kind}"))
+                for kind in KINDS
+                if hasattr(module, f"plot_{kind}")
+            ]
+        modules.append(StatisticModule(module, plots))
+    return modules
+
+
+def selected(name: str, only: Sequence[str]) -> bool:
+    """Whether a statistic is selected by any prefix, e.g. 01, s02_03 or 03_02_both"""
+    return not only or any(name.startswith(prefix.removeprefix("s")) for prefix in only)
+
+
+async def frames(module: StatisticModule) -> Tuple[StatisticModule, List[DataFrame]]:
+    """Run the queries of a module"""
+    result = await getattr(module.module, "main")()
+    dfs = list(result) if isinstance(result, (tuple, list)) else [result]
+    if len(dfs) != len(module.statistics):
+        raise ValueError(
+            f"{module.module.__name__}: main() returned {len(dfs)} frames for "
+            f"{len(module.statistics)} plot functions"
+        )
+    return module, dfs
+
+
+async def run_statistics(
+    modules: Sequence[StatisticModule],
+    output: Path,
+    only: Sequence[str] = (),
+    concurrency: int = 8,
+    pool: Optional[Executor] = None,
+) -> None:
+    """
+    Write the CSV and the plot of all selected statistics of the modules.
+
+    With a pool, the plots are rendered there, otherwise one after another in this
+    process.
+    """
+    limit_queries(concurrency)
+    output.mkdir(parents=True, exist_ok=True)
+
+    async def save(name: str, job: PlotJob) -> None:
+        if pool is None:
+            render(job)
+        else:
+            await get_running_loop().run_in_executor(pool, render, job)
+        print(f"{name} done! ✅")
+
+    saving = []
+    for done in as_completed([frames(module) for module in modules]):
+        module, dfs = await done
+        for statistic, df in zip(module.statistics, dfs):
+            if selected(statistic.name, only):
+                df.to_csv(output / f"{statistic.name}.csv", index=False)
+                job = PlotJob(df, statistic.plot, str(output / f"{statistic.name}.png"))
+                saving.append(create_task(save(statistic.name, job)))
+    await gather(*saving)
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        default=[],
+        help="prefixes of the statistics to run, e.g. 01, s02_03 or 03_02_both",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="number of queries running at once, at most the connection pool size",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        help="number of processes rendering the plots, by default one per CPU",
+    )
+    parser.add_argument("--output", type=Path, default=Path("plots"))
+    parser.add_argument(
+        "--no-cache", action="store_true", help="query the DB instead of the cache"
+    )
+    args = parser.parse_args()
+    if args.no_cache:
+        statistics.result_cache = None
+
+    modules = [
+        module
+        for module in discover()
+        if any(selected(statistic.name, args.only) for statistic in module.statistics)
+    ]
+    if not modules:
+        parser.error(f"argument --only: no statistic matches {' '.join(args.only)}")
+    with render_pool(args.processes) as pool:
+        install()
+        run(run_statistics(modules, args.output, args.only, args.concurrency, pool))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
 """Reviewers and ratings: Expertise Level vs Rating"""
 from asyncio import run
 
-from matplotlib import pyplot as plt
 from matplotlib.axes import Axes
 from pandas import DataFrame
 from seaborn import barplot
@@ -9,7 +8,7 @@ from sqlalchemy import func
 from sqlalchemy.future import select
 from uvloop import install
 
-from cmt_statistics_tool.statistics import get_data, plot_df
+from cmt_statistics_tool.statistics import PlotJob, get_data, render
 from cmt_statistics_tool.tables import SubmissionReview
 
 
@@ -50,6 +49,5 @@ def plot(df: DataFrame, ax: Axes) -> None:
 if __name__ == "__main__":
     install()
     df = run(main())
-    fig = plot_df(df, plot)
-    plt.savefig("plots/01_01.png")
     print(df)
+    render(PlotJob(df, plot, "plots/01_01.png"))
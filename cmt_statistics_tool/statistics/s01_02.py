@@ -2,24 +2,29 @@
 from asyncio import gather, run
 from typing import Tuple, Type, Union
 
-from matplotlib import pyplot as plt
 from matplotlib.axes import Axes
 from pandas import DataFrame
 from seaborn import barplot, color_palette
-from sqlalchemy import func
 from sqlalchemy.future import select
 from sqlalchemy.sql.selectable import Select
 from uvloop import install
 
-from cmt_statistics_tool.statistics import format_sort_track, get_data, plot_df
+from cmt_statistics_tool.statistics import (
+    PlotJob,
+    format_sort_track,
+    get_data,
+    render_all,
+)
 from cmt_statistics_tool.tables import Revision, Submission
+from cmt_statistics_tool.tables.views import status_counts, sum_counts
 
 
 def statement(paper: Union[Type[Submission], Type[Revision]]) -> Select:
+    view = status_counts[paper]
     return (
-        select(paper.track_name, paper.status, func.count())
-        .group_by(paper.track_name, paper.status)
-        .order_by(paper.track_name, paper.status)
+        select(view.c.track_name, view.c.status, sum_counts(view.c.count))
+        .group_by(view.c.track_name, view.c.status)
+        .order_by(view.c.track_name, view.c.status)
     )
 
 
@@ -96,7 +101,9 @@ if __name__ == "__main__":
     install()
     s_df, r_df = run(main())
     print(s_df, r_df, sep="\n")
-    plot_df(s_df, plot_submission)
-    plt.savefig("plots/01_02_submission.png")
-    plot_df(r_df, plot_revision)
-    plt.savefig("plots/01_02_revision.png")
+    render_all(
+        [
+            PlotJob(s_df, plot_submission, "plots/01_02_submission.png"),
+            PlotJob(r_df, plot_revision, "plots/01_02_revision.png"),
+        ]
+    )
@@ -2,24 +2,29 @@
 from asyncio import gather, run
 from typing import Tuple, Type, Union
 
-from matplotlib import pyplot as plt
 from matplotlib.axes import Axes
 from pandas import DataFrame
 from seaborn import barplot, color_palette
-from sqlalchemy import func
 from sqlalchemy.future import select
 from sqlalchemy.sql.selectable import Select
 from uvloop import install
 
-from cmt_statistics_tool.statistics import format_sort_track, get_data, plot_df
+from cmt_statistics_tool.statistics import (
+    PlotJob,
+    format_sort_track,
+    get_data,
+    render_all,
+)
 from cmt_statistics_tool.tables import Revision, Submission
+from cmt_statistics_tool.tables.views import status_counts, sum_counts
 
 
 def statement(paper: Union[Type[Submission], Type[Revision]]) -> Select:
+    view = status_counts[paper]
     return (
-        select(paper.track_name, func.count())
-        .group_by(paper.track_name)
-        .order_by(paper.track_name)
+        select(view.c.track_name, sum_counts(view.c.count))
+        .group_by(view.c.track_name)
+        .order_by(view.c.track_name)
     )
 
 
@@ -52,19 +57,8 @@ def plot_both(df: DataFrame, ax: Axes) -> None:
     ax.set_title("Number of papers over time")
 
 
-async def main() -> Tuple[DataFrame, DataFrame]:
-    return await gather(submission(), revision())
-
-
-if __name__ == "__main__":
-    install()
-    s_df, r_df = run(main())
-    plot_df(s_df, plot_submission)
-    plt.savefig("plots/01_03_submission.png")
-    plot_df(r_df, plot_revision)
-    plt.savefig("plots/01_03_revision.png")
-    print(s_df, r_df, sep="\n")
-    plot_df(
+def combine(s_df: DataFrame, r_df: DataFrame) -> DataFrame:
+    return (
         s_df.set_index("Track")
         .rename(columns={"Count": "Original Submission"})
         .join(
@@ -73,7 +67,23 @@ if __name__ == "__main__":
         .fillna(0)
         .astype(int)
         .reset_index()
-        .melt(id_vars=["Track"], var_name="Type", value_name="Count"),
-        plot_both,
+        .melt(id_vars=["Track"], var_name="Type", value_name="Count")
+    )
+
+
+async def main() -> Tuple[DataFrame, DataFrame, DataFrame]:
+    s_df, r_df = await gather(submission(), revision())
+    return s_df, r_df, combine(s_df, r_df)
+
+
+if __name__ == "__main__":
+    install()
+    s_df, r_df, b_df = run(main())
+    print(s_df, r_df, sep="\n")
+    render_all(
+        [
+            PlotJob(s_df, plot_submission, "plots/01_03_submission.png"),
+            PlotJob(r_df, plot_revision, "plots/01_03_revision.png"),
+            PlotJob(b_df, plot_both, "plots/01_03_both.png"),
+        ]
     )
-    plt.savefig("plots/01_03_both.png")
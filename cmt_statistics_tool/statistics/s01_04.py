@@ -2,23 +2,26 @@
 from asyncio import gather, run
 from typing import Tuple
 
-from matplotlib import pyplot as plt
 from matplotlib.axes import Axes
 from pandas import DataFrame
 from sqlalchemy import func
 from sqlalchemy.future import select
 from uvloop import install
 
-from cmt_statistics_tool.statistics import get_data, plot_df
+from cmt_statistics_tool.statistics import PlotJob, get_data, render_all
 from cmt_statistics_tool.tables import Revision, Submission
+from cmt_statistics_tool.tables.views import paper_fact, status_counts, sum_counts
+
+submissions = status_counts[Submission]
+revisions = status_counts[Revision]
 
 
 async def submission() -> DataFrame:
     statement = (
-        select(Submission.category, func.count())
-        .where(Submission.status.in_(["Accept", "Minor revision", "Major revision"]))  # type: ignore
-        .group_by(Submission.category)
-        .order_by(Submission.category)
+        select(submissions.c.category, sum_counts(submissions.c.count))
+        .where(submissions.c.status.in_(["Accept", "Minor revision", "Major revision"]))
+        .group_by(submissions.c.category)
+        .order_by(submissions.c.category)
     )
     df = DataFrame(await get_data(statement))
     df.rename(columns={0: "Category", 1: "Fraction"}, inplace=True)
@@ -45,10 +48,10 @@ def plot_submission(df: DataFrame, ax: Axes) -> None:
 
 async def revision() -> DataFrame:
     statement = (
-        select(Revision.category, func.count())
-        .where(Revision.status == "Accept")
-        .group_by(Revision.category)
-        .order_by(Revision.category)
+        select(revisions.c.category, sum_counts(revisions.c.count))
+        .where(revisions.c.status == "Accept")
+        .group_by(revisions.c.category)
+        .order_by(revisions.c.category)
     )
     df = DataFrame(await get_data(statement))
     df.rename(columns={0: "Category", 1: "Fraction"}, inplace=True)
@@ -75,19 +78,13 @@ def plot_revision(df: DataFrame, ax: Axes) -> None:
 
 async def both() -> DataFrame:
     statement = (
-        select(Submission.category, func.count())
-        .where(Submission.status == "Accept")
-        .group_by(Submission.category)
-        .order_by(Submission.category)
-    ).union_all(
-        select(Revision.category, func.count())
-        .where(Revision.status == "Accept")
-        .group_by(Revision.category)
-        .order_by(Revision.category)
+        select(paper_fact.c.category, func.count())
+        .where(paper_fact.c.ultimately_accepted)
+        .group_by(paper_fact.c.category)
+        .order_by(paper_fact.c.category)
     )
     df = DataFrame(await get_data(statement))
     df.rename(columns={0: "Category", 1: "Fraction"}, inplace=True)
-    df = df.groupby("Category").sum().reset_index()
     df["Category"].replace(
         "Experiments, Analysis & Benchmark",
         "Experiments, Analysis\n& Benchmark",
@@ -116,10 +113,11 @@ async def main() -> Tuple[DataFrame, DataFrame, DataFrame]:
 if __name__ == "__main__":
     install()
     s_df, r_df, b_df = run(main())
-    plot_df(s_df, plot_submission)
-    plt.savefig("plots/01_04_submission.png")
-    plot_df(r_df, plot_revision)
-    plt.savefig("plots/01_04_revision.png")
-    plot_df(b_df, plot_both)
-    plt.savefig("plots/01_04_both.png")
     print(s_df, r_df, b_df, sep="\n")
+    render_all(
+        [
+            PlotJob(s_df, plot_submission, "plots/01_04_submission.png"),
+            PlotJob(r_df, plot_revision, "plots/01_04_revision.png"),
+            PlotJob(b_df, plot_both, "plots/01_04_both.png"),
+        ]
+    )
@@ -4,7 +4,6 @@ from itertools import product
 from math import isnan
 from typing import Tuple
 
-from matplotlib import pyplot as plt
 from matplotlib.axes import Axes
 from pandas import DataFrame
 from seaborn import barplot
@@ -12,15 +11,23 @@ from sqlalchemy import func
 from sqlalchemy.future import select
 from uvloop import install
 
-from cmt_statistics_tool.statistics import get_data, plot_df
+from cmt_statistics_tool.statistics import PlotJob, get_data, render_all
 from cmt_statistics_tool.tables import Revision, Submission
+from cmt_statistics_tool.tables.views import paper_fact, status_counts, sum_counts
+
+submissions = status_counts[Submission]
+revisions = status_counts[Revision]
 
 
 async def submission() -> DataFrame:
     statement = (
-        select(Submission.category, Submission.status, func.count())
-        .group_by(Submission.category, Submission.status)
-        .order_by(Submission.category, Submission.status)
+        select(
+            submissions.c.category,
+            submissions.c.status,
+            sum_counts(submissions.c.count),
+        )
+        .group_by(submissions.c.category, submissions.c.status)
+        .order_by(submissions.c.category, submissions.c.status)
     )
     df = DataFrame(await get_data(statement))
     df.rename(columns={0: "Category", 1: "Status", 2: "Count"}, inplace=True)
@@ -78,9 +85,9 @@ def plot_submission(df: DataFrame, ax: Axes) -> None:
 
 async def revision() -> DataFrame:
     statement = (
-        select(Revision.category, Revision.status, func.count())
-        .group_by(Revision.category, Revision.status)
-        .order_by(Revision.category, Revision.status)
+        select(revisions.c.category, revisions.c.status, sum_counts(revisions.c.count))
+        .group_by(revisions.c.category, revisions.c.status)
+        .order_by(revisions.c.category, revisions.c.status)
     )
     df = DataFrame(await get_data(statement))
     df.rename(columns={0: "Category", 1: "Status", 2: "Count"}, inplace=True)
@@ -137,31 +144,14 @@ def plot_revision(df: DataFrame, ax: Axes) -> None:
 
 
 async def both() -> DataFrame:
-    all, acc = await gather(
-        get_data(
-            select(Submission.category, func.count()).group_by(Submission.category)
-        ),
-        get_data(
-            select(Submission.category, func.count())
-            .where(Submission.status == "Accept")
-            .group_by(Submission.category)
-            .union_all(
-                select(Revision.category, func.count())
-                .where(Revision.status == "Accept")
-                .group_by(Revision.category)
-            )
-        ),
-    )
-    return (
-        (
-            DataFrame(all)
-            .set_index(0)
-            .join(DataFrame(acc).groupby(0).sum(), rsuffix="_ua")
-        )
-        .rename(columns={"1": "All", "1_ua": "Ultimately Accepted"})
-        .reset_index()
-        .melt(0, var_name="Status", value_name="Count")
-        .rename(columns={0: "Category"})
+    statement = select(
+        paper_fact.c.category,
+        func.count(),
+        func.count().filter(paper_fact.c.ultimately_accepted),
+    ).group_by(paper_fact.c.category)
+    df = DataFrame(await get_data(statement))
+    return df.rename(columns={0: "Category", 1: "All", 2: "Ultimately Accepted"}).melt(
+        "Category", var_name="Status", value_name="Count"
     )
 
 
@@ -220,9 +210,10 @@ if __name__ == "__main__":
     install()
     s_df, r_df, b_df = run(main())
     print(s_df, r_df, b_df, sep="\n")
-    plot_df(s_df, plot_submission)
-    plt.savefig("plots/02_01_submission.png")
-    plot_df(r_df, plot_revision)
-    plt.savefig("plots/02_01_revision.png")
-    plot_df(b_df, plot_both)
-    plt.savefig("plots/02_01_both.png")
+    render_all(
+        [
+            PlotJob(s_df, plot_submission, "plots/02_01_submission.png"),
+            PlotJob(r_df, plot_revision, "plots/02_01_revision.png"),
+            PlotJob(b_df, plot_both, "plots/02_01_both.png"),
+        ]
+    )
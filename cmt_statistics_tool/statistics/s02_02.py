@@ -3,7 +3,6 @@ from asyncio import gather, run
 from math import isnan
 from typing import Tuple, Union
 
-from matplotlib import pyplot as plt
 from matplotlib.axes import Axes
 from pandas import DataFrame
 from seaborn import barplot, color_palette
@@ -11,7 +10,7 @@ from sqlalchemy import func
 from sqlalchemy.future import select
 from uvloop import install
 
-from cmt_statistics_tool.statistics import get_data, plot_df
+from cmt_statistics_tool.statistics import PlotJob, get_data, render_all
 from cmt_statistics_tool.tables import Revision, Submission
 
 
@@ -110,7 +109,9 @@ if __name__ == "__main__":
     install()
     s_df, r_df = run(main())
     print(s_df, r_df, sep="\n")
-    plot_df(s_df, plot_submission)
-    plt.savefig("plots/02_02_submission.png")
-    plot_df(r_df, plot_revision)
-    plt.savefig("plots/02_02_revision.png")
+    render_all(
+        [
+            PlotJob(s_df, plot_submission, "plots/02_02_submission.png"),
+            PlotJob(r_df, plot_revision, "plots/02_02_revision.png"),
+        ]
+    )
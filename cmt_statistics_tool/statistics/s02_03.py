@@ -4,16 +4,16 @@ from itertools import product
 from math import isnan
 from typing import Tuple
 
-from matplotlib import pyplot as plt
 from matplotlib.axes import Axes
 from pandas import DataFrame
 from seaborn import barplot
-from sqlalchemy import func, literal
+from sqlalchemy import func
 from sqlalchemy.future import select
 from uvloop import install
 
-from cmt_statistics_tool.statistics import get_data, plot_df
+from cmt_statistics_tool.statistics import PlotJob, get_data, render_all
 from cmt_statistics_tool.tables import Revision, Submission
+from cmt_statistics_tool.tables.views import paper_fact
 
 
 async def submission() -> DataFrame:
@@ -125,25 +125,15 @@ def plot_revision(df: DataFrame, ax: Axes) -> None:
 
 
 async def both() -> DataFrame:
-    statement = (
-        select(
-            Submission.primary_subject_area,
-            Submission.status,
-            func.count(),
-            literal("Submission"),
-        )
-        .group_by(Submission.primary_subject_area, Submission.status)
-        .union_all(
-            select(
-                Revision.primary_subject_area,
-                Revision.status,
-                func.count(),
-                literal("Revision"),
-            ).group_by(Revision.primary_subject_area, Revision.status)
-        )
+    subject_area = func.trim(
+        func.split_part(paper_fact.c.primary_subject_area, "->", 1)
     )
+    statement = select(
+        subject_area,
+        func.count(),
+        func.count().filter(paper_fact.c.ultimately_accepted),
+    ).group_by(subject_area)
     df = DataFrame(await get_data(statement))
-    df[0] = df[0].apply(lambda s: s.partition("->")[0].strip())
     df[0].replace(
         {
             "": "None",
@@ -151,25 +141,9 @@ async def both() -> DataFrame:
         },
         inplace=True,
     )
-    df = (
-        df[df[3] == "Submission"]
-        .groupby(0)
-        .sum()
-        .join(
-            df[df[1] == "Accept"].groupby(0).sum(),
-            how="outer",
-            lsuffix="_total",
-            rsuffix="_ua",
-        )
-        .fillna(0)
-        .astype(int)
-        .rename(columns={"2_total": "All", "2_ua": "Ultimately accepted"})
-    )
-    return (
-        df.reset_index()
-        .rename(columns={0: "Primary Subject Area"})
-        .melt(id_vars=["Primary Subject Area"], var_name="Status", value_name="Count")
-    )
+    return df.rename(
+        columns={0: "Primary Subject Area", 1: "All", 2: "Ultimately accepted"}
+    ).melt(id_vars=["Primary Subject Area"], var_name="Status", value_name="Count")
 
 
 def plot_both(df: DataFrame, ax: Axes) -> None:
@@ -211,9 +185,10 @@ if __name__ == "__main__":
     install()
     s_df, r_df, b_df = run(main())
     print(s_df, r_df, sep="\n")
-    plot_df(s_df, plot_submission)
-    plt.savefig("plots/02_03_submission.png")
-    plot_df(r_df, plot_revision)
-    plt.savefig("plots/02_03_revision.png")
-    plot_df(b_df, plot_both)
-    plt.savefig("plots/02_03_both.png")
+    render_all(
+        [
+            PlotJob(s_df, plot_submission, "plots/02_03_submission.png"),
+            PlotJob(r_df, plot_revision, "plots/02_03_revision.png"),
+            PlotJob(b_df, plot_both, "plots/02_03_both.png"),
+        ]
+    )
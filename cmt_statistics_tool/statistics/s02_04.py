@@ -4,37 +4,25 @@ from itertools import product
 from math import isnan
 from typing import Tuple
 
-from matplotlib import pyplot as plt
 from matplotlib.axes import Axes
 from pandas import DataFrame, MultiIndex, RangeIndex
 from seaborn import barplot
-from sqlalchemy import func, literal, text
+from sqlalchemy import func
 from sqlalchemy.future import select
 from uvloop import install
 
-from cmt_statistics_tool.statistics import get_data, plot_df
+from cmt_statistics_tool.statistics import PlotJob, get_data, render_all
 from cmt_statistics_tool.tables import Revision, Submission
-from cmt_statistics_tool.tables.people import PeoplePaperRelation as ppr
-from cmt_statistics_tool.tables.people import RevisionPeople, SubmissionPeople
+from cmt_statistics_tool.tables.views import author_counts, paper_fact
+
+submissions = author_counts[Submission]
+revisions = author_counts[Revision]
 
 
 async def submission() -> DataFrame:
-    statement = (
-        select(text("n_authors"), text("status"), func.count())
-        .select_from(
-            select(
-                Submission.id,
-                Submission.status.label("status"),  # type: ignore
-                func.count().label("n_authors"),
-            )
-            .join_from(Submission, SubmissionPeople)
-            .where(SubmissionPeople.relation_type == ppr.AUTHOR)
-            .group_by(Submission.id)
-            .subquery()
-        )
-        .group_by(text("n_authors"), text("status"))
-        .order_by(text("n_authors"), text("status"))
-    )
+    statement = select(
+        submissions.c.n_authors, submissions.c.status, submissions.c.count
+    ).order_by(submissions.c.n_authors, submissions.c.status)
     df = DataFrame(await get_data(statement))
     df = (
         df.set_index([0, 1])
@@ -67,22 +55,9 @@ def plot_submission(df: DataFrame, ax: Axes) -> None:
 
 
 async def revision() -> DataFrame:
-    statement = (
-        select(text("n_authors"), text("status"), func.count())
-        .select_from(
-            select(
-                Revision.id,
-                Revision.status.label("status"),  # type: ignore
-                func.count().label("n_authors"),
-            )
-            .join_from(Revision, RevisionPeople)
-            .where(RevisionPeople.relation_type == ppr.AUTHOR)
-            .group_by(Revision.id)
-            .subquery()
-        )
-        .group_by(text("n_authors"), text("status"))
-        .order_by(text("n_authors"), text("status"))
-    )
+    statement = select(
+        revisions.c.n_authors, revisions.c.status, revisions.c.count
+    ).order_by(revisions.c.n_authors, revisions.c.status)
     df = DataFrame(await get_data(statement))
     df = (
         df.set_index([0, 1])
@@ -116,53 +91,18 @@ def plot_revision(df: DataFrame, ax: Axes) -> None:
 
 async def both() -> DataFrame:
     statement = (
-        select(text("n_authors"), text("status"), func.count(), literal("Submission"))
-        .select_from(
-            select(
-                Submission.id,
-                Submission.status.label("status"),  # type: ignore
-                func.count().label("n_authors"),
-            )
-            .join_from(Submission, SubmissionPeople)
-            .where(SubmissionPeople.relation_type == ppr.AUTHOR)
-            .group_by(Submission.id)
-            .subquery()
+        select(
+            paper_fact.c.n_authors,
+            func.count(),
+            func.count().filter(paper_fact.c.ultimately_accepted),
         )
-        .group_by(text("n_authors"), text("status"))
-    ).union_all(
-        select(text("n_authors"), text("status"), func.count(), literal("Revision"))
-        .select_from(
-            select(
-                Revision.id,
-                Revision.status.label("status"),  # type: ignore
-                func.count().label("n_authors"),
-            )
-            .join_from(Revision, RevisionPeople)
-            .where(
-                RevisionPeople.relation_type == ppr.AUTHOR, Revision.status == "Accept"
-            )
-            .group_by(Revision.id)
-            .subquery()
-        )
-        .group_by(text("n_authors"), text("status"))
-    )
-    df = DataFrame(await get_data(statement))
-    df = (
-        df[df[3] == "Submission"]
-        .groupby(0)
-        .sum()
-        .join(
-            df[df[1] == "Accept"].groupby(0).sum(),
-            how="outer",
-            lsuffix="_total",
-            rsuffix="_ua",
-        )
-        .fillna(0)
-        .astype(int)
-        .rename(columns={"2_total": "All", "2_ua": "Ultimately accepted"})
+        .where(paper_fact.c.n_authors > 0)
+        .group_by(paper_fact.c.n_authors)
     )
+    df = DataFrame(await get_data(statement)).set_index(0)
     return (
         df.reindex(RangeIndex(df.index.min(), df.index.max() + 1), fill_value=0)
+        .rename(columns={1: "All", 2: "Ultimately accepted"})
         .reset_index()
         .rename(columns={"index": "Number of Authors"})
         .melt(id_vars=["Number of Authors"], var_name="Status", value_name="Count")
@@ -212,9 +152,10 @@ if __name__ == "__main__":
     s_df, r_df, b_df = run(main())
 
     print(s_df, r_df, b_df, sep="\n")
-    plot_df(s_df, plot_submission)
-    plt.savefig("plots/02_04_submission.png")
-    plot_df(r_df, plot_revision)
-    plt.savefig("plots/02_04_revision.png")
-    plot_df(b_df, plot_both)
-    plt.savefig("plots/02_04_both.png")
+    render_all(
+        [
+            PlotJob(s_df, plot_submission, "plots/02_04_submission.png"),
+            PlotJob(r_df, plot_revision, "plots/02_04_revision.png"),
+            PlotJob(b_df, plot_both, "plots/02_04_both.png"),
+        ]
+    )
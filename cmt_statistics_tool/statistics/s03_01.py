@@ -2,7 +2,6 @@
 from asyncio import run
 from math import isnan
 
-from matplotlib import pyplot as plt
 from matplotlib.axes import Axes
 from pandas import DataFrame, RangeIndex
 from seaborn import barplot
@@ -10,7 +9,7 @@ from sqlalchemy import func, literal
 from sqlalchemy.future import select
 from uvloop import install
 
-from cmt_statistics_tool.statistics import get_data, plot_df
+from cmt_statistics_tool.statistics import PlotJob, get_data, render
 from cmt_statistics_tool.tables import (
     People,
     Revision,
@@ -122,5 +121,4 @@ if __name__ == "__main__":
     install()
     b_df = run(main())
     print(b_df, sep="\n")
-    plot_df(b_df, plot_both)
-    plt.savefig("plots/03_01_both.png")
+    render(PlotJob(b_df, plot_both, "plots/03_01_both.png"))
@@ -2,36 +2,35 @@
 from asyncio import gather, run
 from typing import Tuple
 
-from matplotlib import pyplot as plt
 from matplotlib.axes import Axes
-from pandas import DataFrame, MultiIndex
+from pandas import DataFrame
 from seaborn import barplot, color_palette
 from sqlalchemy import func, literal
-from sqlalchemy.dialects.postgresql import aggregate_order_by
 from sqlalchemy.future import select
-from sqlalchemy.orm import aliased
 from uvloop import install
 
-from cmt_statistics_tool.statistics import get_data, plot_df
-from cmt_statistics_tool.tables import (
-    Revision,
-    RevisionPeople,
-    Submission,
-    SubmissionPeople,
-)
-from cmt_statistics_tool.tables.people import People
-from cmt_statistics_tool.tables.people import PeoplePaperRelation as ppr
+from cmt_statistics_tool.statistics import PlotJob, get_data, render_all
+from cmt_statistics_tool.tables import Revision, Submission
+from cmt_statistics_tool.tables.views import country_counts, paper_fact, sum_counts
+
+submissions = country_counts[Submission]
+revisions = country_counts[Revision]
 
 
 async def submission() -> DataFrame:
     statement = (
-        select(People.country, Submission.status, func.count())
-        .join_from(People, Submission, onclause=People.primary_author_submissions)
-        .group_by(People.country, Submission.status)
+        select(
+            submissions.c.primary_country,
+            submissions.c.status,
+            sum_counts(submissions.c.count),
+        )
+        .group_by(submissions.c.primary_country, submissions.c.status)
         .union_all(
-            select(People.country, literal("All"), func.count())
-            .join_from(People, Submission, onclause=People.primary_author_submissions)
-            .group_by(People.country)
+            select(
+                submissions.c.primary_country,
+                literal("All"),
+                sum_counts(submissions.c.count),
+            ).group_by(submissions.c.primary_country)
         )
     )
     return DataFrame(await get_data(statement)).rename(
@@ -55,13 +54,18 @@ def plot_submission(df: DataFrame, ax: Axes) -> None:
 
 async def revision() -> DataFrame:
     statement = (
-        select(People.country, Revision.status, func.count())
-        .join_from(People, Revision, onclause=People.primary_author_revisions)
-        .group_by(People.country, Revision.status)
+        select(
+            revisions.c.primary_country,
+            revisions.c.status,
+            sum_counts(revisions.c.count),
+        )
+        .group_by(revisions.c.primary_country, revisions.c.status)
         .union_all(
-            select(People.country, literal("All"), func.count())
-            .join_from(People, Revision, onclause=People.primary_author_revisions)
-            .group_by(People.country)
+            select(
+                revisions.c.primary_country,
+                literal("All"),
+                sum_counts(revisions.c.count),
+            ).group_by(revisions.c.primary_country)
         )
     )
     return DataFrame(await get_data(statement)).rename(
@@ -84,80 +88,15 @@ def plot_revision(df: DataFrame, ax: Axes) -> None:
 
 
 async def both() -> DataFrame:
-    primary_author = aliased(People)
-    primary_author_revision = aliased(People)
-    statement = (
-        select(
-            Submission.status,
-            primary_author.country,
-            func.array_agg(aggregate_order_by(People.country, People.id)),
-            literal("Submission"),
-        )
-        .join_from(Submission, SubmissionPeople)
-        .join_from(SubmissionPeople, People)
-        .join_from(Submission, primary_author, onclause=Submission.primary_author)
-        .where(SubmissionPeople.relation_type == ppr.AUTHOR)
-        .group_by(Submission.id, primary_author)
-        .union_all(
-            select(
-                Revision.status,
-                primary_author_revision.country,
-                func.array_agg(aggregate_order_by(People.country, People.id)),
-                literal("Revision"),
-            )
-            .join_from(Revision, RevisionPeople)
-            .join_from(RevisionPeople, People)
-            .join_from(
-                Revision, primary_author_revision, onclause=Revision.primary_author
-            )
-            .where(RevisionPeople.relation_type == ppr.AUTHOR)
-            .group_by(Revision.id, primary_author_revision)
-        )
-    )
+    country = func.coalesce(paper_fact.c.country, "None")
+    statement = select(
+        country,
+        func.count(),
+        func.count().filter(paper_fact.c.ultimately_accepted),
+    ).group_by(country)
     df = DataFrame(await get_data(statement))
-    df["Country/Region"] = (
-        (df[1].apply(lambda x: [x]) + df[2])
-        .apply(
-            lambda countries: (
-                [country for country in countries if country is not None] + [None]
-            )[0]
-        )
-        .fillna("None")
-    )
-    df.drop(columns=[1, 2], inplace=True)
-    df["Count"] = 1
-    df = df.groupby([3, "Country/Region", 0]).sum()
-    df = df.reset_index()
-    accepted_revisions = (
-        df[(df[3] == "Revision") & (df[0] == "Accept")]
-        .drop(columns=[0, 3])
-        .set_index("Country/Region")
-    )
-    df = df[df[3] == "Submission"].drop(columns=[3])
-    df = df.set_index(["Country/Region", 0])
-    df = df.reindex(
-        MultiIndex.from_product(
-            (
-                df.index.get_level_values("Country/Region").unique(),
-                df.index.get_level_values(0).unique(),
-            )
-        ),
-        fill_value=0,
-    )
-    df = df.reset_index().rename(columns={0: "Status"})
-    accept = (
-        df[df["Status"] == "Accept"]
-        .drop(columns=["Status"])
-        .set_index("Country/Region")
-    )
-    total = df.groupby("Country/Region").sum()
-    accept = DataFrame(
-        accept.join(accepted_revisions, rsuffix="_r").sum(axis=1).astype(int)
-    ).rename(columns={0: "Count"})
     return (
-        total.join(accept, rsuffix="_ua")
-        .rename(columns={"Count": "All", "Count_ua": "Ultimately Accepted"})
-        .reset_index()
+        df.rename(columns={0: "Country/Region", 1: "All", 2: "Ultimately Accepted"})
         .melt(id_vars=["Country/Region"], var_name="Status", value_name="Count")
         .sort_values(["Country/Region", "Status"])
     )
@@ -225,9 +164,10 @@ if __name__ == "__main__":
     install()
     s_df, r_df, b_df = run(main())
     print(s_df, r_df, b_df, sep="\n")
-    plot_df(s_df, plot_submission)
-    plt.savefig("plots/03_02_submission.png")
-    plot_df(r_df, plot_revision)
-    plt.savefig("plots/03_02_revision.png")
-    plot_df(b_df, plot_both)
-    plt.savefig("plots/03_02_both.png")
+    render_all(
+        [
+            PlotJob(s_df, plot_submission, "plots/03_02_submission.png"),
+            PlotJob(r_df, plot_revision, "plots/03_02_revision.png"),
+            PlotJob(b_df, plot_both, "plots/03_02_both.png"),
+        ]
+    )
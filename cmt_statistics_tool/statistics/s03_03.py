@@ -1,7 +1,6 @@
 """Other: Number of accepted papers per email domain"""
 from asyncio import run
 
-from matplotlib import pyplot as plt
 from matplotlib.axes import Axes
 from pandas import DataFrame
 from seaborn import barplot, color_palette
@@ -9,25 +8,18 @@ from sqlalchemy import func
 from sqlalchemy.future import select
 from uvloop import install
 
-from cmt_statistics_tool.statistics import get_data, plot_df
-from cmt_statistics_tool.tables import Revision, Submission
-from cmt_statistics_tool.tables.people import People
+from cmt_statistics_tool.statistics import PlotJob, get_data, render
+from cmt_statistics_tool.tables.views import paper_fact
 
 
 async def both() -> DataFrame:
     statement = (
-        select(func.lower(func.split_part(People.email, "@", 2)))
-        .join_from(Submission, People, onclause=Submission.primary_author)
-        .where(Submission.status == "Accept")
-        .union_all(
-            select(func.lower(func.split_part(People.email, "@", 2)))
-            .join_from(Revision, People, onclause=Revision.primary_author)
-            .where(Revision.status == "Accept")
-        )
+        select(paper_fact.c.email_domain, func.count())
+        .where(paper_fact.c.ultimately_accepted)
+        .group_by(paper_fact.c.email_domain)
     )
     df = DataFrame(await get_data(statement))
-    df["Count"] = 1
-    return df.groupby(0).sum().reset_index().rename(columns={0: "Email domain"})
+    return df.rename(columns={0: "Email domain", 1: "Count"})
 
 
 def plot_both(df: DataFrame, ax: Axes) -> None:
@@ -56,5 +48,4 @@ if __name__ == "__main__":
     install()
     b_df = run(main())
     print(b_df, sep="\n")
-    plot_df(b_df, plot_both)
-    plt.savefig("plots/03_03_both.png")
+    render(PlotJob(b_df, plot_both, "plots/03_03_both.png"))
@@ -1,12 +1,11 @@
 """Other: Number of papers per country/region (pie)"""
 from asyncio import run
 
-from matplotlib import pyplot as plt
 from matplotlib.axes import Axes
 from pandas import DataFrame, concat
 from uvloop import install
 
-from cmt_statistics_tool.statistics import plot_df
+from cmt_statistics_tool.statistics import PlotJob, render
 from cmt_statistics_tool.statistics.s03_02 import both
 
 
@@ -40,5 +39,4 @@ if __name__ == "__main__":
     install()
     b_df = run(main())
     print(b_df, sep="\n")
-    plot_df(b_df, plot_both)
-    plt.savefig("plots/03_04_both.png")
+    render(PlotJob(b_df, plot_both, "plots/03_04_both.png"))
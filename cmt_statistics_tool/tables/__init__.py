@@ -1,9 +1,19 @@
+from sqlalchemy import Table
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-Base = declarative_base()
 
+class TableAttributes:
+    """What all tables have, for the type checker"""
+
+    __tablename__: str
+    __table__: Table
+
+
+Base = declarative_base(cls=TableAttributes)
+
+from cmt_statistics_tool.tables.checkpoint import Checkpoint  # noqa: E402
 from cmt_statistics_tool.tables.metareview import (  # noqa: E402
     RevisionMetareview,
     SubmissionMetareview,
@@ -11,6 +21,7 @@ from cmt_statistics_tool.tables.metareview import (  # noqa: E402
 from cmt_statistics_tool.tables.paper import Revision, Submission  # noqa: E402
 from cmt_statistics_tool.tables.people import (  # noqa: E402
     People,
+    PeopleIdentity,
     RevisionPeople,
     SubmissionPeople,
 )
@@ -18,6 +29,7 @@ from cmt_statistics_tool.tables.review import (  # noqa: E402
     RevisionReview,
     SubmissionReview,
 )
+from cmt_statistics_tool.tables.row_hash import RowHash  # noqa: E402
 from cmt_statistics_tool.tables.seniormetareview import (  # noqa: E402
     RevisionSeniormetareview,
     SubmissionSeniormetareview,
@@ -34,15 +46,18 @@ async_session = sessionmaker(
 
 __all__ = (
     "Base",
+    "Checkpoint",
     "RevisionMetareview",
     "SubmissionMetareview",
     "Revision",
     "Submission",
     "People",
+    "PeopleIdentity",
     "SubmissionPeople",
     "RevisionPeople",
     "RevisionReview",
     "SubmissionReview",
+    "RowHash",
     "RevisionSeniormetareview",
     "SubmissionSeniormetareview",
     "engine",
@@ -0,0 +1,18 @@
+from sqlalchemy import Boolean, Column, Integer, String
+
+from cmt_statistics_tool.tables import Base
+
+
+class Checkpoint(Base):
+    """Progress of an import stage, used for resuming a failed import"""
+
+    __tablename__ = "checkpoint"
+    stage: str = Column(String(100), primary_key=True)
+    # Number of chunks committed so far
+    chunks: int = Column(Integer, nullable=False)
+    finished: bool = Column(Boolean, nullable=False)
+    # Shard count and chunk sizes of the import, which the stages and chunks depend on
+    parameters: str = Column(String(200), nullable=False)
+
+    def __repr__(self) -> str:
+        return f"Checkpoint(stage={self.stage}, chunks={self.chunks})"
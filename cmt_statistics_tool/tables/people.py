@@ -117,3 +117,18 @@ class People(Base):
 
     def __repr__(self) -> str:
         return f"People(name={self.name}, email={self.email})"
+
+
+class PeopleIdentity(Base):
+    """The person all rows of the same researcher are merged into, see identities"""
+
+    __tablename__ = "people_identity"
+    people_id: int = Column(ForeignKey("people.id"), primary_key=True)
+    # The smallest id of all rows of the researcher
+    identity_id: int = Column(ForeignKey("people.id"), nullable=False, index=True)
+
+    def __repr__(self) -> str:
+        return (
+            f"PeopleIdentity(people_id={self.people_id}, "
+            f"identity_id={self.identity_id})"
+        )
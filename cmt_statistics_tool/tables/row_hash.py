@@ -0,0 +1,17 @@
+from sqlalchemy import BigInteger, Column, Integer, String
+
+from cmt_statistics_tool.tables import Base
+
+
+class RowHash(Base):
+    """Content hash of an imported source row, used for incremental imports"""
+
+    __tablename__ = "row_hash"
+    table_name: str = Column(String(100), primary_key=True)
+    paper_id: int = Column(Integer, primary_key=True)
+    # 0 for tables with one row per paper
+    people_id: int = Column(Integer, primary_key=True)
+    hash: int = Column(BigInteger, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"RowHash(table_name={self.table_name}, paper_id={self.paper_id})"
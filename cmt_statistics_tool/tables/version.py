@@ -0,0 +1,52 @@
+"""
+Versions of the tables' data, which the statistics cache their results by.
+
+Every transaction writing to a table logs it in table_version, see bump_versions in
+the helper module. The version of a table is the largest id logged for it, so
+concurrent writers only append rows instead of waiting for each other.
+table_version has its own MetaData, so it is not dropped with the other tables and
+versions are never handed out twice.
+"""
+from typing import Dict, Iterable, Set, Union
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, func
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.sql.selectable import CompoundSelect, Select
+from sqlalchemy.sql.visitors import iterate
+
+version_metadata = MetaData()
+
+table_version = Table(
+    "table_version",
+    version_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("table_name", String(100), nullable=False, index=True),
+)
+
+
+def read_tables(statement: Union[Select, CompoundSelect, Table]) -> Set[str]:
+    """Get the names of all tables and views a statement reads, see the views module"""
+    names = set()
+    for element in iterate(statement):
+        if isinstance(element, Table):
+            names.add(element.name)
+            if "query" in element.info:
+                names |= read_tables(element.info["query"])
+    return names
+
+
+async def table_versions(
+    connection: Union[AsyncSession, AsyncConnection], names: Iterable[str]
+) -> Dict[str, int]:
+    """Get the versions of tables, 0 for tables never written to"""
+    names = sorted(names)
+    result = await connection.execute(
+        select(table_version.c.table_name, func.max(table_version.c.id))
+        .where(table_version.c.table_name.in_(names))
+        .group_by(table_version.c.table_name)
+    )
+    return {
+        **dict.fromkeys(names, 0),
+        **{name: version for name, version in result.fetchall()},
+    }
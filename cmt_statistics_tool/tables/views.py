@@ -0,0 +1,198 @@
+"""
+Materialized views of the aggregates most statistics are computed from.
+
+The views are kept in their own MetaData, so the tables' create_all and drop_all do
+not touch them. Each view is created from its query with a unique index, which
+allows refreshing it concurrently, without blocking the statistics reading it.
+Statistics read the views instead of the base tables, so their cost does not grow
+with the number of papers and people.
+paper_fact has one row per original submission, with its linked revision, so the
+statistics of "both" are aggregates of a single view instead of a union of
+submissions and revisions.
+"""
+from typing import Any, Dict, Sequence, Tuple, Type, Union
+
+from sqlalchemy import Column, Integer, MetaData, Table, Text, cast, func, or_
+from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.sql.selectable import Select
+
+from cmt_statistics_tool.tables.paper import Revision, Submission
+from cmt_statistics_tool.tables.people import People
+from cmt_statistics_tool.tables.people import PeoplePaperRelation as ppr
+from cmt_statistics_tool.tables.people import RevisionPeople, SubmissionPeople
+
+view_metadata = MetaData()
+Paper = Union[Type[Submission], Type[Revision]]
+PeoplePaper = Union[Type[SubmissionPeople], Type[RevisionPeople]]
+PAPERS: Tuple[Paper, ...] = (Submission, Revision)
+
+
+def people_paper_mapping(paper: Paper) -> PeoplePaper:
+    """Get the table relating the people to a paper"""
+    return SubmissionPeople if paper == Submission else RevisionPeople
+
+
+def view(name: str, query: Select, unique: Sequence[str]) -> Table:
+    """Declare a view with the columns of its query"""
+    return Table(
+        name,
+        view_metadata,
+        *(Column(column.name, column.type) for column in query.selected_columns),
+        info={"query": query, "unique": tuple(unique)},
+    )
+
+
+def sum_counts(count: ColumnElement[Any]) -> ColumnElement[Integer]:
+    """Sum up the counts of a view as an integer, instead of a numeric"""
+    return cast(func.sum(count), Integer)
+
+
+def status_query(paper: Paper) -> Select:
+    """Count the papers by track, category, and status"""
+    return select(
+        paper.track_name,
+        paper.category,
+        paper.status,
+        func.count().label("count"),
+    ).group_by(paper.track_name, paper.category, paper.status)
+
+
+def author_query(paper: Paper) -> Select:
+    """Count the papers by their number of authors and status"""
+    people = people_paper_mapping(paper)
+    authors = (
+        select(paper.status, func.count().label("n_authors"))
+        .join_from(paper, people)
+        .where(people.relation_type == ppr.AUTHOR)
+        .group_by(paper.id, paper.status)
+        .subquery()
+    )
+    return select(
+        authors.c.n_authors, authors.c.status, func.count().label("count")
+    ).group_by(authors.c.n_authors, authors.c.status)
+
+
+def author_country(paper: Paper) -> ColumnElement[Any]:
+    """Get the first known country/region of the authors of a paper by their id"""
+    people = people_paper_mapping(paper)
+    paper_id = people.__table__.c[f"{paper.__tablename__}_id"]
+    return (
+        select(People.country)
+        .join_from(people, People)
+        .where(
+            paper_id == paper.id,
+            people.relation_type == ppr.AUTHOR,
+            People.country.isnot(None),
+        )
+        .order_by(People.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def country_query(paper: Paper) -> Select:
+    """
+    Count the papers by country/region and status.
+
+    primary_country is the country/region of the primary contact, country the first
+    known one of the primary contact and the authors by their id.
+    """
+    primary_author = aliased(People)
+    papers = (
+        select(
+            primary_author.country.label("primary_country"),
+            func.coalesce(primary_author.country, author_country(paper)).label(
+                "country"
+            ),
+            paper.status,
+        )
+        .join_from(paper, primary_author, onclause=paper.primary_author)
+        .subquery()
+    )
+    return select(
+        papers.c.primary_country,
+        papers.c.country,
+        papers.c.status,
+        func.count().label("count"),
+    ).group_by(papers.c.primary_country, papers.c.country, papers.c.status)
+
+
+def fact_query() -> Select:
+    """
+    Get one row per original submission, with its latest linked revision.
+
+    status is the final status, of the revision if there is one. A submission is
+    ultimately accepted if either it or its revision is accepted. All other columns
+    are those of the original submission, country like in country_query and
+    email_domain that of the primary contact.
+    """
+    revision = aliased(Revision)
+    primary_author = aliased(People)
+    linked = (
+        select(Revision.submission_id, func.max(Revision.id).label("revision_id"))
+        .where(Revision.submission_id.isnot(None))
+        .group_by(Revision.submission_id)
+        .subquery()
+    )
+    n_authors = (
+        select(func.count())
+        .where(
+            SubmissionPeople.submission_id == Submission.id,
+            SubmissionPeople.relation_type == ppr.AUTHOR,
+        )
+        .scalar_subquery()
+    )
+    submission = Submission.__table__.c
+    status = func.coalesce(revision.status, submission.status)
+    return (
+        select(
+            submission.id.label("submission_id"),
+            linked.c.revision_id,
+            status.label("status"),
+            or_(submission.status == "Accept", status == "Accept").label(
+                "ultimately_accepted"
+            ),
+            Submission.category,
+            Submission.track_name,
+            Submission.primary_subject_area,
+            n_authors.label("n_authors"),
+            func.coalesce(primary_author.country, author_country(Submission)).label(
+                "country"
+            ),
+            func.lower(func.split_part(primary_author.email, "@", 2), type_=Text).label(
+                "email_domain"
+            ),
+        )
+        .join_from(Submission, primary_author, onclause=Submission.primary_author)
+        .outerjoin(linked, linked.c.submission_id == Submission.id)
+        .outerjoin(revision, revision.id == linked.c.revision_id)
+    )
+
+
+status_counts: Dict[Paper, Table] = {
+    paper: view(
+        f"{paper.__tablename__}_status_counts",
+        status_query(paper),
+        ("track_name", "category", "status"),
+    )
+    for paper in PAPERS
+}
+author_counts: Dict[Paper, Table] = {
+    paper: view(
+        f"{paper.__tablename__}_author_counts",
+        author_query(paper),
+        ("n_authors", "status"),
+    )
+    for paper in PAPERS
+}
+country_counts: Dict[Paper, Table] = {
+    paper: view(
+        f"{paper.__tablename__}_country_counts",
+        country_query(paper),
+        ("primary_country", "country", "status"),
+    )
+    for paper in PAPERS
+}
+paper_fact = view("paper_fact", fact_query(), ("submission_id",))
@@ -1,15 +1,20 @@
-"""Gets the people counts by number of papers and status."""
+"""
+Gets the people counts by number of papers and status.
+
+People are counted by their identity, so researchers with several people rows are
+counted once, see the identities insert module.
+"""
 from asyncio import gather, run
 from typing import Tuple, Type, Union
 
 from pandas import DataFrame
-from sqlalchemy import func
+from sqlalchemy import distinct, func
 from sqlalchemy.future import select
 from sqlalchemy.sql import Subquery
 from uvloop import install
 
 from cmt_statistics_tool.tables import (
-    People,
+    PeopleIdentity,
     Revision,
     RevisionPeople,
     Submission,
@@ -40,13 +45,23 @@ async def get_df(substatement: Subquery) -> DataFrame:
 
 
 async def authors(paper: Union[Type[Submission], Type[Revision]]) -> DataFrame:
-    people_paper_mapping = SubmissionPeople if paper == Submission else RevisionPeople
+    people_paper_mapping: Union[Type[SubmissionPeople], Type[RevisionPeople]] = (
+        SubmissionPeople if paper == Submission else RevisionPeople
+    )
     substatement = (
-        select(People.id, paper.status, func.count().label("n_submissions"))
-        .join_from(People, people_paper_mapping)
+        select(
+            PeopleIdentity.identity_id,
+            paper.status,
+            func.count(distinct(paper.id)).label("n_submissions"),
+        )
+        .join_from(
+            PeopleIdentity,
+            people_paper_mapping,
+            PeopleIdentity.people_id == people_paper_mapping.people_id,
+        )
         .join_from(people_paper_mapping, paper)
-        .where(people_paper_mapping.relation_type == ppr.AUTHOR)  # type: ignore
-        .group_by(People.id, paper.status)
+        .where(people_paper_mapping.relation_type == ppr.AUTHOR)
+        .group_by(PeopleIdentity.identity_id, paper.status)
         .subquery()
     )
     return await get_df(substatement)
@@ -55,11 +70,14 @@ async def authors(paper: Union[Type[Submission], Type[Revision]]) -> DataFrame:
 async def primary_authors(paper: Union[Type[Submission], Type[Revision]]) -> DataFrame:
     substatement = (
         select(
-            paper.primary_author_id,
+            PeopleIdentity.identity_id,
             paper.status,
             func.count().label("n_submissions"),
         )
-        .group_by(paper.primary_author_id, paper.status)
+        .join_from(
+            paper, PeopleIdentity, paper.primary_author_id == PeopleIdentity.people_id
+        )
+        .group_by(PeopleIdentity.identity_id, paper.status)
         .subquery()
     )
     return await get_df(substatement)
@@ -1,5 +1,507 @@
-from cmt_statistics_tool import __version__
+from asyncio import run
+from pathlib import Path
+from types import ModuleType, SimpleNamespace
+from typing import Any, List, Tuple
+
+import pytest
+from matplotlib.axes import Axes
+from pandas import DataFrame, Series
+from sqlalchemy.future import select
+from sqlalchemy.sql.selectable import Select
+
+from cmt_statistics_tool import __version__, helper
+from cmt_statistics_tool.benchmark.generate import generate
+from cmt_statistics_tool.cache import cached
+from cmt_statistics_tool.helper import (
+    Checkpoints,
+    PeopleRegistry,
+    ResumeError,
+    RowHashes,
+    compact_dtypes,
+    hash_rows,
+    read_original_revision,
+    shard_chunks,
+)
+from cmt_statistics_tool.insert import review_shards, reviews
+from cmt_statistics_tool.insert.identities import (
+    candidate,
+    resolve_identities,
+    same_person,
+)
+from cmt_statistics_tool.insert.mapping import Field, Mapping
+from cmt_statistics_tool.insert.papers import separate_people
+from cmt_statistics_tool.insert.people import people_names
+from cmt_statistics_tool.insert.pipeline import pipeline
+from cmt_statistics_tool.insert.scheduler import Loader, Timing, critical_path
+from cmt_statistics_tool.insert.validation import Reference, chunk_sources, validate
+from cmt_statistics_tool.statistics.cache import ResultCache
+from cmt_statistics_tool.statistics.runner import (
+    Statistic,
+    StatisticModule,
+    run_statistics,
+)
+from cmt_statistics_tool.tables import (
+    Revision,
+    RevisionReview,
+    Submission,
+    SubmissionReview,
+)
+from cmt_statistics_tool.tables.people import PeoplePaperRelation as ppr
+from cmt_statistics_tool.tables.version import read_tables
+from cmt_statistics_tool.tables.views import paper_fact
 
 
 def test_version() -> None:
     assert __version__ == "0.1.0"
+
+
+def test_people_registry() -> None:
+    registry = PeopleRegistry()
+    first = registry.get_or_add("Jane  Doe", "Jane.Doe@example.org", "HPI")
+    assert registry.get_or_add(" Jane Doe", "*jane.doe@example.org ", "") == first
+    assert registry.get_or_add("John Doe", "jane.doe@example.org", "") != first
+    assert [p["id"] for p in registry.pending] == [1, 2]
+
+
+def test_separate_people() -> None:
+    df = DataFrame(
+        {
+            "Paper ID": [10, 11],
+            "Authors": ["Jane Doe (HPI); John Roe (UW)*; Broken", "Ann Lee (A (B))"],
+            "Author Emails": ["jane@hpi.de;*john@uw.edu*;broken@x", "ann@a;extra@b"],
+            "Reviewers": ["", ""],
+            "Reviewer Emails": ["", ""],
+            "MetaReviewers": ["Max Mu (Org)", ""],
+            "MetaReviewer Emails": ["max@org", ""],
+            "SeniorMetaReviewers": ["", ""],
+            "SeniorMetaReviewerEmails": ["", ""],
+        },
+        index=[0, 0],
+    )
+    people = separate_people(df)
+    assert people.values.tolist() == [
+        [10, ppr.AUTHOR, 0, "Jane Doe", "HPI", "jane@hpi.de"],
+        [10, ppr.AUTHOR, 1, "John Roe", "UW", "john@uw.edu"],
+        [11, ppr.AUTHOR, 0, "Ann Lee", "A (B)", "ann@a"],
+        [10, ppr.METAREVIEWER, 0, "Max Mu", "Org", "max@org"],
+    ]
+
+
+def test_critical_path() -> None:
+    async def insert(items: Any) -> None:
+        pass
+
+    loaders = [
+        Loader("people", list, insert, ("people",), ()),
+        Loader("papers", list, insert, ("submission",), ("people",)),
+        Loader("reviews", list, insert, ("review",), ("people", "submission")),
+    ]
+    timings = {
+        "people": Timing(1, 1, 2),
+        "papers": Timing(3, 3, 5),
+        "reviews": Timing(1, 5, 6),
+    }
+    assert critical_path(loaders, timings) == [
+        ("parse papers", 3),
+        ("insert papers", 2),
+        ("insert reviews", 1),
+    ]
+
+
+def test_row_hashes() -> None:
+    df = DataFrame({"Paper ID": [1, 1, 2], "Summary": ["a", "b", "c"]})
+    hashes = RowHashes(SubmissionReview)
+    hashes.stored = {(1, 10): hash_rows(df)[0], (1, 11): 0, (3, 10): 0}
+    hashes.unseen = set(hashes.stored)
+    assert hashes.changed(hash_rows(df), df["Paper ID"], [10, 11, 10]) == [
+        False,
+        True,
+        True,
+    ]
+    assert hashes.unseen == {(3, 10)}
+    assert [(row["paper_id"], row["people_id"]) for row in hashes.pending] == [
+        (1, 11),
+        (2, 10),
+    ]
+
+
+def test_cached(tmp_path: Path) -> None:
+    calls = []
+
+    def parse(path: str) -> Tuple[DataFrame, DataFrame]:
+        calls.append(path)
+        return DataFrame({"Paper ID": [1, 2]}), DataFrame({"Title": ["a", None]})
+
+    path = tmp_path / "papers.xlsx"
+    path.write_bytes(b"export")
+    first = cached(parse, str(path))
+    second = cached(parse, str(path))
+    assert len(calls) == 1
+    assert all(a.equals(b) for a, b in zip(first, second))
+    path.write_bytes(b"changed export")
+    cached(parse, str(path))
+    assert len(calls) == 2
+
+
+def test_checkpoints_remaining() -> None:
+    checkpoints = Checkpoints()
+    checkpoints.chunks = {"reviews": 2}
+    assert list(checkpoints.remaining("reviews", "abcd")) == [(2, "c"), (3, "d")]
+    assert list(checkpoints.remaining("papers", "ab")) == [(0, "a"), (1, "b")]
+
+
+def test_generate(tmp_path: Path) -> None:
+    generate(str(tmp_path), 20)
+    papers, revisions = read_original_revision(str(tmp_path / "papers.xlsx"))
+    assert len(papers) == 20
+    people = separate_people(papers)
+    assert (people["relation_type"] == ppr.REVIEWER).sum() == 60
+    submission_reviews, revision_reviews = read_original_revision(
+        str(tmp_path / "reviews.xlsx")
+    )
+    assert len(submission_reviews) == 60
+    assert len(revision_reviews) == 3 * len(revisions)
+    assert set(reviews.submission_mapping.columns) - set(submission_reviews) == {
+        "Reviewer ID"
+    }
+
+
+def test_shard_chunks() -> None:
+    chunks = [
+        (False, DataFrame({"Paper ID": [1, 1, 2, 3, 4, 5, 6]})),
+        (True, DataFrame({"Paper ID": [7, 8]})),
+    ]
+    shards = shard_chunks(chunks, 3)
+    assert [(shard.low, shard.high) for shard in shards] == [
+        (None, 3),
+        (3, 6),
+        (6, None),
+    ]
+    assert [
+        [(is_revision, list(df["Paper ID"])) for is_revision, df in shard.chunks]
+        for shard in shards
+    ] == [
+        [(False, [1, 1, 2])],
+        [(False, [3, 4, 5])],
+        [(False, [6]), (True, [7, 8])],
+    ]
+    assert len(shard_chunks([], 4)) == 1
+
+
+def test_pipeline() -> None:
+    written: List[int] = []
+
+    async def write(item: int) -> None:
+        if item > 10:
+            raise ValueError(item)
+        written.append(item)
+
+    run(pipeline(range(1, 6), lambda item: item * 2, write, maxsize=1))
+    assert written == [2, 4, 6, 8, 10]
+    with pytest.raises(ValueError):
+        run(pipeline(range(1, 100), lambda item: item * 2, write))
+
+
+class LazyBeginSession:
+    """
+    A session whose transactions only begin with their first statement, like
+    SQLAlchemy's asyncpg adapter. Anything written outside of them commits at once.
+    """
+
+    def __init__(self) -> None:
+        self.started = False
+        self.pending: List[Any] = []
+        self.committed: List[Any] = []
+        self.rows: List[Any] = []
+
+    async def __aenter__(self) -> "LazyBeginSession":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        pass
+
+    def begin(self) -> "LazyBeginTransaction":
+        return LazyBeginTransaction(self)
+
+    def write(self, item: Any) -> None:
+        (self.pending if self.started else self.committed).append(item)
+
+    async def execute(self, statement: Any) -> Any:
+        self.started = True
+        self.write(statement)
+        return SimpleNamespace(fetchall=lambda: self.rows)
+
+    async def connection(self) -> Any:
+        async def get_raw_connection() -> Any:
+            return SimpleNamespace(driver_connection=self)
+
+        return SimpleNamespace(get_raw_connection=get_raw_connection)
+
+    def is_in_transaction(self) -> bool:
+        return self.started
+
+    async def copy_records_to_table(self, table: str, **kwargs: Any) -> None:
+        self.write(f"COPY {table}")
+
+
+class LazyBeginTransaction:
+    def __init__(self, session: LazyBeginSession) -> None:
+        self.session = session
+
+    def __await__(self) -> Any:
+        yield from ()
+        return self
+
+    async def __aenter__(self) -> "LazyBeginTransaction":
+        return self
+
+    async def __aexit__(self, exc_type: Any, *exc: Any) -> None:
+        await (self.rollback() if exc_type else self.commit())
+
+    async def commit(self) -> None:
+        self.session.committed += self.session.pending
+        await self.rollback()
+
+    async def rollback(self) -> None:
+        self.session.pending = []
+        self.session.started = False
+
+
+def test_copy_in_transaction(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    generate(str(tmp_path), 5)
+    submission_reviews, _ = read_original_revision(str(tmp_path / "reviews.xlsx"))
+    chunks = [(False, submission_reviews)]
+    session = LazyBeginSession()
+    monkeypatch.setattr(review_shards, "async_session", lambda: session)
+    registry = PeopleRegistry()
+    monkeypatch.setattr(registry, "commit", lambda: session.__aexit__())
+
+    async def fail(*args: Any) -> None:
+        raise ValueError("interrupted")
+
+    checkpoints = Checkpoints()
+    monkeypatch.setattr(checkpoints, "save", fail)
+    with pytest.raises(ValueError):
+        run(reviews.insert_reviews(chunks, registry, checkpoints=checkpoints))
+    # Only the row hashes were read
+    assert all(isinstance(item, Select) for item in session.committed)
+    run(reviews.insert_reviews(chunks, registry, checkpoints=Checkpoints()))
+    assert "COPY submission_review" in session.committed
+
+
+def test_checkpoints_parameters(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = LazyBeginSession()
+    session.rows = [("papers/0", 3, False, "papers=500, shards=4")]
+    monkeypatch.setattr(helper, "async_session", lambda: session)
+    checkpoints = run(Checkpoints({"shards": 4, "papers": 500}).load())
+    assert checkpoints.chunks == {"papers/0": 3}
+    with pytest.raises(ResumeError):
+        run(Checkpoints({"shards": 2, "papers": 500}).load())
+
+
+def test_people_names() -> None:
+    df = DataFrame(
+        {
+            "First Name": ["Jane ", "John", " Ann"],
+            "Middle Initial (optional)": ["", " Q.", "  "],
+            "Last Name": ["Doe", "Roe ", "Lee"],
+        }
+    )
+    assert list(people_names(df)) == ["Jane Doe", "John Q. Roe", "Ann Lee"]
+
+
+def test_validate() -> None:
+    papers = DataFrame({"Paper ID": [1, 2, 2], "Paper Title": ["A", None, "C"]})
+    reviews = DataFrame(
+        {
+            "Paper ID": [1, 1, 3],
+            "Reviewer Name": ["Jane Doe", "Jane  Doe", "John Roe"],
+            "Reviewer Email": ["jane@hpi.de", "Jane@hpi.de", "john@uw.edu"],
+        }
+    )
+    sources = [
+        *chunk_sources(
+            [(False, papers)],
+            Mapping(
+                Submission, [Field("Paper ID", "id"), Field("Paper Title", "title")]
+            ),
+            Mapping(Revision, [Field("Paper ID", "id")]),
+            {},
+        ),
+        *chunk_sources(
+            [(False, reviews)],
+            Mapping(
+                SubmissionReview,
+                [
+                    Field("Paper ID", "submission_id"),
+                    Field("Reviewer ID", "reviewer_id"),
+                ],
+            ),
+            Mapping(RevisionReview, []),
+            {"Reviewer ID": ("Reviewer Name", "Reviewer Email")},
+        ),
+    ]
+    assert validate(
+        sources, [Reference("mapping", Series([2, 4]), "submission.id")]
+    ) == [
+        "submission: 1 rows without Paper Title, e.g. Paper ID 2",
+        "submission: 2 rows with a duplicate id, e.g. Paper ID 2",
+        "submission_review: 2 rows with a duplicate submission_id, reviewer_id, "
+        "e.g. Paper ID 1",
+        "mapping: 1 rows reference a missing submission.id, e.g. 4",
+        "submission_review.submission_id: 1 rows reference a missing submission.id, "
+        "e.g. 3",
+    ]
+
+
+def test_resolve_identities() -> None:
+    people = DataFrame(
+        {
+            "id": [1, 2, 3, 4, 5, 6, 7],
+            "name": [
+                "Jane Doe",
+                "J. Doe",
+                "Doe Jane",
+                "John Roe",
+                "José Müller",
+                "Jose Muller",
+                "Jon Roe",
+            ],
+            "email": [
+                "jane@hpi.de",
+                "jane@hpi.de*",
+                "jane.doe@gmail.com",
+                "john@hpi.de",
+                "jm@uw.edu",
+                "jose.mueller@uw.edu",
+                "jroe@hpi.de",
+            ],
+            "affiliation": [
+                "HPI",
+                "",
+                "Hasso Plattner Institute",
+                "HPI",
+                "University of Washington",
+                "University of Washington",
+                "",
+            ],
+        }
+    )
+    identities = resolve_identities(people)
+    assert identities["identity_id"].tolist() == [1, 1, 3, 4, 5, 5, 4]
+    people.loc[2, "affiliation"] = "hpi"
+    identities = resolve_identities(people)
+    assert identities["identity_id"].tolist() == [1, 1, 1, 4, 5, 5, 4]
+
+
+def test_resolve_namesakes() -> None:
+    people = DataFrame(
+        {
+            "id": [1, 2, 3, 4, 5, 6, 7, 8],
+            "name": [
+                "Wei Zhang",
+                "Zhang Wei",
+                "Wei Zhang",
+                "Wei Zhang",
+                "John Smith",
+                "Jane Smith",
+                "Anna Berg",
+                "Ana Berg",
+            ],
+            "email": [
+                "wei@tsinghua.edu.cn",
+                "zhangw@gmail.com",
+                "zw@tsinghua.edu.cn",
+                "wei.zhang@gmail.com",
+                "jsmith@a.org",
+                "jsmith@b.org",
+                "anna@gmail.com",
+                "ana.berg@gmail.com",
+            ],
+            "affiliation": [
+                "Tsinghua University",
+                "Microsoft",
+                "",
+                "",
+                "",
+                "",
+                "",
+                "",
+            ],
+        }
+    )
+    # Same names sharing a domain, the same local-part at different domains, and
+    # similar names at a webmail provider
+    identities = resolve_identities(people)
+    assert identities["identity_id"].tolist() == [1, 2, 3, 4, 5, 6, 7, 8]
+    li, lin = (
+        candidate(1, "Li Li", "li@tum.de", ""),
+        candidate(2, "Li Lin", "lin@tum.de", ""),
+    )
+    assert not same_person(li, lin)
+
+
+def test_compact_dtypes() -> None:
+    df = compact_dtypes(
+        DataFrame(
+            {
+                "Paper ID": range(9),
+                "Status": [*["Accept", "Reject"] * 4, None],
+                "Title": [*"ABCDEFGH", None],
+                "Mixed": [*"ABCDEFGH", 1],
+            }
+        )
+    )
+    assert [str(dtype) for dtype in df.dtypes] == [
+        "int64",
+        "category",
+        "string",
+        "object",
+    ]
+    status = Mapping(Submission, [Field("Status", "status", fillna="")])
+    assert list(status.tuples(status.prepare(df)))[-2:] == [("Reject",), ("",)]
+    title = Mapping(Submission, [Field("Title", "title")])
+    assert list(title.tuples(df))[-2:] == [("H",), (None,)]
+    numbers = DataFrame(
+        {"Rating": [1, 2] * 4, "Score": [0.5] * 8, "Late": [True, False] * 4}
+    )
+    dtypes = list(numbers.dtypes)
+    assert list(compact_dtypes(numbers).dtypes) == dtypes
+
+
+def test_run_statistics(tmp_path: Path) -> None:
+    async def main() -> Tuple[DataFrame, DataFrame]:
+        df = DataFrame({"Status": ["Accept", "Reject"], "Count": [1, 2]})
+        return df, df
+
+    def plot(df: DataFrame, ax: Axes) -> None:
+        ax.bar(df["Status"], df["Count"])
+
+    module = ModuleType("s99_99")
+    module.main = main  # type: ignore
+    statistics = [Statistic("99_99_submission", plot), Statistic("99_99_both", plot)]
+    run(run_statistics([StatisticModule(module, statistics)], tmp_path, ["s99_99_b"]))
+    assert sorted(file.name for file in tmp_path.iterdir()) == [
+        "99_99_both.csv",
+        "99_99_both.png",
+    ]
+
+
+def test_result_cache(tmp_path: Path) -> None:
+    assert read_tables(select(paper_fact.c.category)) == {
+        "paper_fact",
+        "people",
+        "revision",
+        "submission",
+        "submission_people",
+    }
+    cache = ResultCache(tmp_path)
+    rows = [("Accept", 1, 0.5), ("Reject", None, None)]
+    cache.store("a", ["status", "count", "share"], rows)
+    assert cache.load("b") is None
+    cached = cache.load("a")
+    assert cached == rows
+    assert [type(row.count) for row in cached or []] == [int, type(None)]
+    cache.max_bytes = (tmp_path / "a.parquet").stat().st_size
+    cache.store("b", ["status", "count", "share"], rows)
+    assert [file.name for file in tmp_path.iterdir()] == ["b.parquet"]